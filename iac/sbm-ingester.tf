@@ -116,10 +116,22 @@ resource "aws_lambda_function" "sbm_files_ingester" {
   handler       = "gemsDataParseAndWrite.lambda_handler"
   runtime       = "python3.12"
   memory_size   = 512
-  timeout       = 120
+  timeout       = 300
   reserved_concurrent_executions = 5
   s3_bucket = "gega-code-deployment-bucket"
   s3_key    = "sbm-files-ingester/ingester.zip"
+
+  environment {
+    variables = {
+      # monitorPoint, file or batch
+      sensorOutputMode        = "file"
+      sensorOutputTargetRows  = "1000000"
+      sensorOutputTargetBytes = "33554432"
+      sensorOutputGzip        = "false"
+      # Seconds before the cached nem12_mappings.json is revalidated
+      nem12MappingsTtlSeconds = "300"
+    }
+  }
 }
 
 # -----------------------------
@@ -127,7 +139,8 @@ resource "aws_lambda_function" "sbm_files_ingester" {
 # -----------------------------
 resource "aws_sqs_queue" "sbm_files_ingester_queue" {
   name                       = "sbm-files-ingester-queue"
-  visibility_timeout_seconds = 300
+  # At least 6x the ingester timeout, as recommended for Lambda SQS triggers
+  visibility_timeout_seconds = 1800
 }
 
 # -----------------------------
@@ -188,7 +201,10 @@ resource "aws_sqs_queue_policy" "queue_policy" {
 resource "aws_lambda_event_source_mapping" "sqs_trigger" {
   event_source_arn = aws_sqs_queue.sbm_files_ingester_queue.arn
   function_name    = aws_lambda_function.sbm_files_ingester.arn
-  batch_size       = 1
+  batch_size       = 20
+  maximum_batching_window_in_seconds = 30
+  # Only the messages of files that failed are returned to the queue
+  function_response_types = ["ReportBatchItemFailures"]
   scaling_config {
     maximum_concurrency = 5
   }
@@ -0,0 +1,169 @@
+"""Benchmark of the columnar NEM12 readings against Reading tuples.
+
+Writes a synthetic NEM12 file of --nmis NMIs x --channels channels x --days
+days of --interval minute readings, with 400 event rows and a few values
+that aren't numbers. Reads it with the Reading tuple parse that the
+columnar mode replaced, and with read_nem_file(columnar=True). Reports the
+peak and retained memory of each read (tracemalloc), the read time and the
+time to build the data frames, and exits non-zero if the readings differ.
+read_nem_file(columnar=False) now converts the columnar blocks, so it can't
+serve as the reference.
+
+    python ingester/benchmarks/columnar_readings.py --nmis 40 --days 30
+"""
+
+import argparse
+import csv
+import gc
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.nemreader import read_nem_file  # noqa: E402
+from modules.nemreader.nem_reader import (  # noqa: E402
+    flatten_list,
+    parse_200_row,
+    parse_300_row,
+    parse_400_row,
+    update_reading_events,
+)
+from modules.nemreader.columnar import block_to_readings  # noqa: E402
+from modules.nemreader.outputs import get_data_frame  # noqa: E402
+
+SUFFIXES = ["E1", "B1", "Q1", "K1", "E2", "B2", "Q2", "K2"]
+
+
+def nem12_text(nmis: int, channels: int, days: int, interval: int, seed: int = 0) -> str:
+    """A NEM12 file with one 200 block per channel, and an event on about one day in ten."""
+    rng = random.Random(seed)
+    per_day = 24 * 60 // interval
+    rows = ["100,NEM12,202301010000,SENDER,RECEIVER"]
+    for nmi in range(nmis):
+        for suffix in SUFFIXES[:channels]:
+            rows.append(f"200,NMI{nmi:07d},E1B1Q1K1,1,{suffix},N1,METSER{nmi},KWH,{interval},")
+            for day in range(days):
+                values = [f"{rng.random() * 10:.3f}" for _ in range(per_day)]
+                if rng.random() < 0.01:
+                    values[rng.randrange(per_day)] = "-"
+                date = f"2023{1 + day // 28:02d}{1 + day % 28:02d}"
+                if rng.random() < 0.1:
+                    rows.append(f"300,{date},{','.join(values)},V,,,20230601000000,")
+                    start = rng.randrange(1, per_day)
+                    rows.append(f"400,1,{start - 1 or 1},A,,")
+                    rows.append(f"400,{start},{per_day},S53,79,Estimated")
+                else:
+                    rows.append(f"300,{date},{','.join(values)},A,,,20230601000000,")
+    rows.append("900")
+    return "\n".join(rows) + "\n"
+
+
+def legacy_read(file_name: str) -> dict:
+    """The Reading tuple parse of NEM12 rows: a list per 300 row, updated by its 400 rows."""
+    readings = {}
+    with open(file_name, newline="") as nem_file:
+        for row in csv.reader(nem_file):
+            if row[0] == "200":
+                nmi_d = parse_200_row(row)
+                channel = readings.setdefault(nmi_d.nmi, {}).setdefault(nmi_d.nmi_suffix + "_" + nmi_d.uom, [])
+            elif row[0] == "300":
+                channel.append(
+                    parse_300_row(row, nmi_d.interval_length, nmi_d.uom, nmi_d.meter_serial_number).interval_values
+                )
+            elif row[0] == "400":
+                channel[-1] = update_reading_events(channel[-1], parse_400_row(row))
+    return {
+        nmi: {channel: flatten_list(days) for channel, days in channels.items()}
+        for nmi, channels in readings.items()
+    }
+
+
+def measure_memory(func) -> tuple:
+    """Peak and retained bytes allocated while func runs, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, retained, result
+
+
+def differing_channels(tuples: dict, columnar: dict) -> list:
+    """The NMI channels whose readings differ between the two parses."""
+    differ = []
+    if list(tuples) != list(columnar):
+        return ["NMIs"]
+    for nmi, channels in tuples.items():
+        if list(channels) != list(columnar[nmi]):
+            differ.append(nmi)
+            continue
+        for channel, readings in channels.items():
+            if block_to_readings(columnar[nmi][channel]) != readings:
+                differ.append(f"{nmi} {channel}")
+    return differ
+
+
+def best_of(runs: int, func) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nmis", type=int, default=40)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=5, help="minutes per reading")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    # Both parses log a warning for every value that isn't a number
+    logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_name = os.path.join(folder, "benchmark.csv")
+        with open(file_name, "w") as nem_file:
+            nem_file.write(nem12_text(args.nmis, args.channels, args.days, args.interval))
+        size = os.path.getsize(file_name)
+
+        def frames(readings):
+            return [get_data_frame(dict.fromkeys(channels, []), channels) for channels in readings.values()]
+
+        results = {}
+        for name, read in (
+            ("Reading tuples", lambda: legacy_read(file_name)),
+            ("columnar", lambda: read_nem_file(file_name, columnar=True).readings),
+        ):
+            peak, retained, readings = measure_memory(read)
+            read_seconds = best_of(args.runs, read)
+            frame_seconds = best_of(args.runs, lambda: frames(readings))
+            results[name] = (readings, peak, retained, read_seconds, frame_seconds)
+
+    differ = differing_channels(results["Reading tuples"][0], results["columnar"][0])
+    for channel in differ[:20]:
+        print(f"FAIL: {channel}: columnar readings differ from Reading tuples")
+    if differ:
+        sys.exit(1)
+
+    intervals = sum(len(block.t_start) for channels in results["columnar"][0].values() for block in channels.values())
+    print(f"{size / 2**20:.1f} MiB, {intervals} intervals, identical readings, best of {args.runs}")
+    print(f"  {'':16}{'peak':>10}{'retained':>10}{'read':>10}{'frames':>10}")
+    base = results["Reading tuples"]
+    for name, (_, peak, retained, read_seconds, frame_seconds) in results.items():
+        print(
+            f"  {name:16}{peak / 2**20:8.1f} MB{retained / 2**20:8.1f} MB"
+            f"{read_seconds:9.2f} s{frame_seconds:9.2f} s"
+            + (f"  ({base[1] / peak:.1f}x less peak, {base[3] / read_seconds:.1f}x faster read)" if name == "columnar" else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
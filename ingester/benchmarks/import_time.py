@@ -0,0 +1,78 @@
+"""Import time benchmark for the ingester Lambda's cold start.
+
+Imports gemsDataParseAndWrite in fresh interpreters with `python -X importtime`,
+prints the median import time and the slowest modules it imports directly,
+and fails if the median is over budget or a deferred module (pandas by
+default) was imported. Importing must not need AWS credentials or network.
+
+    python ingester/benchmarks/import_time.py --runs 5 --budget 0.6
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+MODULE = "gemsDataParseAndWrite"
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import seconds of each module imported by one fresh import of module."""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, AWS_DEFAULT_REGION="ap-southeast-2")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times[name.strip()] = (int(cumulative) / 1e6, depth)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    parser.add_argument("--budget", type=float, default=None, help="maximum median seconds")
+    parser.add_argument("--deferred", nargs="*", default=["pandas"], help="modules that must not be imported")
+    args = parser.parse_args()
+
+    runs = [import_times(MODULE) for _ in range(args.runs)]
+    totals = [times[MODULE][0] for times in runs]
+    median = statistics.median(totals)
+    print(f"import {MODULE}: median {median:.3f}s over {args.runs} runs (min {min(totals):.3f}s, max {max(totals):.3f}s)")
+
+    # Direct imports of the module, by their median cumulative time
+    last = runs[-1]
+    children = [name for name, (_, depth) in last.items() if depth == 1]
+    child_times = {
+        name: statistics.median(times[name][0] for times in runs if name in times)
+        for name in children
+    }
+    for name, seconds in sorted(child_times.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {seconds:8.3f}s  {name}")
+
+    failed = False
+    imported = [name for name in args.deferred if any(name in times for times in runs)]
+    if imported:
+        print(f"FAIL: imported at module load: {', '.join(imported)}")
+        failed = True
+    if args.budget is not None and median > args.budget:
+        print(f"FAIL: median {median:.3f}s is over the {args.budget:.3f}s budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
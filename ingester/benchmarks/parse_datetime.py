@@ -0,0 +1,131 @@
+"""Regression check and benchmark of the NEM date parser.
+
+Checks that _parse_nem_datetime gives the same result as the strptime parser
+it replaced for a set of edge cases and --samples random strings, then times
+both on the date fields of a synthetic NEM12 file: a Date8 on the 300 row of
+each day and a DateTime14 update time, for --nmis NMIs x --channels channels
+x --days days. Exits non-zero if any result differs.
+
+    python ingester/benchmarks/parse_datetime.py --nmis 40 --days 30
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.nemreader.nem_reader import _parse_nem_datetime  # noqa: E402
+
+EDGE_CASES = [
+    "20230101",
+    "202301011230",
+    "20230101123045",
+    " 20230101 ",
+    "20240229",
+    "20230229",
+    "20231301",
+    "20230101246000",
+    "2023010",
+    "2023010112",
+    "202301011230450",
+    "abcdefgh",
+    "2023-01-01",
+    "+2023010",
+    "2023 101",
+    "２０２３０１０１",
+    "00000101",
+]
+
+
+def strptime_parse(record: str):
+    """The parser _parse_nem_datetime replaced."""
+    format_strings = {8: "%Y%m%d", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}
+    try:
+        return datetime.strptime(record.strip(), format_strings[len(record.strip())])
+    except (ValueError, KeyError):
+        return None
+
+
+def random_strings(count: int, seed: int = 0) -> list:
+    """Mostly digits, of NEM lengths and the lengths either side, with some noise."""
+    rng = random.Random(seed)
+    strings = []
+    for _ in range(count):
+        length = rng.choice([7, 8, 9, 11, 12, 13, 14, 15])
+        value = [rng.choice("0123456789") for _ in range(length)]
+        if rng.random() < 0.5:
+            # A plausible date, so most strings get past the month and day checks
+            value[:8] = (datetime(2000, 1, 1) + timedelta(days=rng.randrange(15000))).strftime("%Y%m%d")
+        if rng.random() < 0.1:
+            value[rng.randrange(length)] = rng.choice(" -+.a")
+        strings.append("".join(value)[:length])
+    return strings
+
+
+def nem12_date_fields(nmis: int, channels: int, days: int) -> list:
+    """The date fields read from a NEM12 file, in file order."""
+    fields = []
+    for _ in range(nmis * channels):
+        for day in range(days):
+            date = datetime(2023, 1, 1) + timedelta(days=day)
+            fields.append(date.strftime("%Y%m%d"))
+            fields.append((date + timedelta(days=1, hours=4)).strftime("%Y%m%d%H%M%S"))
+    return fields
+
+
+def best_of(runs: int, func) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nmis", type=int, default=40)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    uncached = _parse_nem_datetime.__wrapped__
+    failed = [
+        value
+        for value in EDGE_CASES + random_strings(args.samples)
+        if uncached(value) != strptime_parse(value) or _parse_nem_datetime(value) != strptime_parse(value)
+    ]
+    for value in failed[:20]:
+        print(f"FAIL: {value!r}: {_parse_nem_datetime(value)} != strptime {strptime_parse(value)}")
+    if failed:
+        sys.exit(1)
+    print(f"{len(EDGE_CASES) + args.samples} strings parsed identically to strptime")
+
+    fields = nem12_date_fields(args.nmis, args.channels, args.days)
+
+    def cached():
+        # Each file starts with an empty cache
+        _parse_nem_datetime.cache_clear()
+        for value in fields:
+            _parse_nem_datetime(value)
+
+    strptime_seconds = best_of(args.runs, lambda: [strptime_parse(value) for value in fields])
+    sliced_seconds = best_of(args.runs, lambda: [uncached(value) for value in fields])
+    cached_seconds = best_of(args.runs, cached)
+    per_call = 1e6 / len(fields)
+    print(f"{len(fields)} date fields ({len(set(fields))} distinct), best of {args.runs}")
+    print(f"  strptime              {strptime_seconds * 1000:8.1f} ms  {strptime_seconds * per_call:5.2f} us/call")
+    print(f"  sliced                {sliced_seconds * 1000:8.1f} ms  {sliced_seconds * per_call:5.2f} us/call"
+          f"  ({strptime_seconds / sliced_seconds:.1f}x)")
+    print(f"  sliced + lru_cache    {cached_seconds * 1000:8.1f} ms  {cached_seconds * per_call:5.2f} us/call"
+          f"  ({strptime_seconds / cached_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
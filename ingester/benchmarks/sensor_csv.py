@@ -0,0 +1,80 @@
+"""Benchmark of the hudibucketsrc sensor CSV serialiser.
+
+Times SensorDataCsvEncoder, plain and gzip, against the pandas path it
+replaced (strftime of ts and its, then DataFrame.to_csv) on --rows rows of
+--interval minute readings, and exits non-zero if their output differs. The
+edge cases are covered by ingester/tests/test_sensorDataCsv.py.
+
+    python ingester/benchmarks/sensor_csv.py --rows 1000000
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.sensorDataCsv import SensorDataCsvEncoder  # noqa: E402
+from modules.sensorDataWriter import SENSOR_DATA_COLUMNS  # noqa: E402
+
+
+def pandas_csv(df: pd.DataFrame) -> bytes:
+    """The serialisation the encoder replaced."""
+    df = df.copy()
+    for column in ("ts", "its"):
+        if df[column].dtype.kind == "M" or isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df[SENSOR_DATA_COLUMNS].to_csv(index=False).encode("utf-8")
+
+
+def sensor_frame(rows: int, interval: str = "30min", start: str = "2024-01-01", seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(start, periods=rows, freq=interval)
+    # Meter readings, which are parsed from text with a few decimal places
+    values = (rng.random(rows) * 100).round(3)
+    values[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({"sensorId": "p:site:1a2b3c", "ts": ts, "val": values, "unit": "kwh", "its": ts})
+
+
+def best_of(runs: int, func) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--interval", default="5min")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    encoder = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS)
+    compressed = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS, compressed=True)
+    df = sensor_frame(args.rows, args.interval)
+    expected = pandas_csv(df)
+    if encoder.encode(df) != expected or gzip.decompress(compressed.encode(df)) != expected:
+        print("FAIL: output differs from DataFrame.to_csv")
+        sys.exit(1)
+
+    pandas_seconds = best_of(args.runs, lambda: pandas_csv(df))
+    encoder_seconds = best_of(args.runs, lambda: encoder.encode(df))
+    body = encoder.encode(df)
+    gzip_seconds = best_of(args.runs, lambda: compressed.encode(df))
+    print(f"{args.rows} rows, best of {args.runs}")
+    print(f"  strftime + to_csv      {pandas_seconds * 1000:8.1f} ms")
+    print(f"  SensorDataCsvEncoder   {encoder_seconds * 1000:8.1f} ms  ({pandas_seconds / encoder_seconds:.1f}x)")
+    print(f"  SensorDataCsvEncoder + gzip {gzip_seconds * 1000:8.1f} ms  "
+          f"({len(body) / 2**20:.1f} MiB -> {len(compressed.encode(df)) / 2**20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark of the wide to long sensor data transform.
+
+Times sensorDataLongFormat against the per-column loop it replaced, on a
+synthetic NMI frame of --days days of --interval minute readings with
+--channels data stream columns, alone and with the frames serialised to CSV
+(SensorDataCsvEncoder against DataFrame.to_csv), and fails if the CSV they
+produce differs.
+
+    python ingester/benchmarks/sensor_transform.py --days 365 --channels 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from modules.sensorDataCsv import SensorDataCsvEncoder  # noqa: E402
+from modules.sensorDataWriter import SENSOR_DATA_COLUMNS, sensorDataLongFormat  # noqa: E402
+
+NMI = "NMI0000001"
+SUFFIXES = {"E1", "E2", "B1", "B2", "Q1", "K1", "E3", "B3"}
+
+
+def make_frame(days: int, interval: int, channels: int) -> tuple:
+    """A wide frame shaped like the NEM reader's output, and mappings for its channels."""
+    t_start = pd.date_range("2024-01-01", periods=days * 24 * 60 // interval, freq=f"{interval}min")
+    rng = np.random.default_rng(0)
+    data = {"t_start": t_start, "t_end": t_start + pd.Timedelta(minutes=interval)}
+    suffixes = sorted(SUFFIXES)[:channels]
+    for suffix in suffixes:
+        values = rng.random(len(t_start)).round(3)
+        values[rng.random(len(t_start)) < 0.01] = np.nan
+        data[suffix + "_kWh"] = values
+    data["quality_method"] = "A"
+    df = pd.DataFrame(data, index=t_start)
+    df.index.name = "t_start"
+    mappings = {f"{NMI}-{suffix}": f"p:test:{i}" for i, suffix in enumerate(suffixes)}
+    return df, mappings
+
+
+def legacy_transform(nmi: str, bufferDF: pd.DataFrame, mappings: dict, suffixes: list) -> list:
+    """The per-column loop: a frame per channel, timestamps formatted twice each."""
+    frames = []
+    for reqCol in filter(lambda x: x.split("_")[0] in suffixes, bufferDF):
+        if "t_start" not in bufferDF.columns and bufferDF.index.name == "t_start":
+            bufferDF = bufferDF.reset_index()
+        eachBufferDF = bufferDF[["t_start", reqCol]].copy()
+        eachBufferDF.set_index("t_start", inplace=True)
+        unit = str.lower(reqCol.split("_")[1])
+        monitorPointName = nmi + "-" + reqCol.split("_")[0]
+        neptuneId = mappings.get(monitorPointName, None)
+        if neptuneId is not None:
+            df = eachBufferDF.copy()
+            df["sensorId"] = neptuneId
+            df["unit"] = unit
+            df.reset_index(inplace=True)
+            df.rename(columns={"t_start": "ts", reqCol: "val"}, inplace=True)
+            df["its"] = df["ts"]
+            df = df[["sensorId", "ts", "val", "unit", "its"]]
+            df["ts"] = df["ts"].dt.strftime("%Y-%m-%d %H:%M:%S")
+            df["its"] = df["its"].dt.strftime("%Y-%m-%d %H:%M:%S")
+            frames.append(df)
+    return frames
+
+
+def best_of(runs: int, func) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", type=int, default=30, help="minutes per reading")
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    df, mappings = make_frame(args.days, args.interval, args.channels)
+    suffixes = sorted(SUFFIXES)
+
+    encoder = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS)
+
+    def legacy_csv():
+        return "".join(frame.to_csv(index=False, header=False) for frame in legacy_transform(NMI, df, mappings, suffixes)).encode("utf-8")
+
+    def long_csv():
+        _, long_df = sensorDataLongFormat(NMI, df, mappings, set(suffixes))
+        return encoder.encode_rows(long_df)
+
+    if long_csv() != legacy_csv():
+        print("FAIL: output differs from the per-column loop")
+        sys.exit(1)
+
+    legacy_seconds = best_of(args.runs, lambda: legacy_transform(NMI, df, mappings, suffixes))
+    long_seconds = best_of(args.runs, lambda: sensorDataLongFormat(NMI, df, mappings, set(suffixes)))
+    legacy_csv_seconds = best_of(args.runs, legacy_csv)
+    long_csv_seconds = best_of(args.runs, long_csv)
+    print(f"{len(df)} rows x {args.channels} channels, best of {args.runs}")
+    print(f"  per-column loop              {legacy_seconds * 1000:8.1f} ms")
+    print(f"  sensorDataLongFormat         {long_seconds * 1000:8.1f} ms  ({legacy_seconds / long_seconds:.1f}x)")
+    print(f"  per-column loop + to_csv     {legacy_csv_seconds * 1000:8.1f} ms")
+    print(f"  sensorDataLongFormat + CSV   {long_csv_seconds * 1000:8.1f} ms  ({legacy_csv_seconds / long_csv_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,27 @@
-from modules.nemreader import output_as_data_frames
+from modules.nemreader import iter_data_frames, channels_in_file
 import os
 import os.path
-import csv
-import pandas as pd
 import json
-import numpy as np
-import datetime as dt
-import boto3
 from pathlib import Path
 import shutil
 import time
-import logging
-import sys
 import traceback
 from modules.nonNemParserFuncs import *
-import requests
-import random
-from modules.common import CloudWatchLogger, BUCKET_NAME
+from modules.common import CloudWatchLogger, BUCKET_NAME, flush_all_loggers, lazy_import
+from modules.sensorDataWriter import SensorDataWriter, SpillBuffer, sensorDataObjectKey, sensorDataLongFormat, SENSOR_DATA_COLUMNS
+from modules.sensorDataCsv import SensorDataCsvEncoder
+from modules.s3Uploader import get_shared_uploader, wait_for_uploads
+from modules.pipeline import StageStats, prefetch
+from modules.s3Stream import S3ObjectStream
+from modules.awsClients import get_client
 import uuid
 from botocore.exceptions import ClientError
 import modules.common as common
+
+pd = lazy_import("pandas")
 import tempfile
 from urllib.parse import unquote
+from itertools import chain
 
 
 execution_log = CloudWatchLogger(common.EXECUTION_LOG_GROUP)
@@ -29,45 +29,102 @@ error_log = CloudWatchLogger(common.ERROR_LOG_GROUP)
 runtime_error_log = CloudWatchLogger(common.RUNTIME_ERROR_LOG_GROUP)
 metrics_log = CloudWatchLogger(common.METRICS_LOG_GROUP)
 
-s3_resource = boto3.resource("s3")
 
 
 
-def read_nem12_mappings(bucket_name: str, object_key: str = "nem12_mappings.json") -> dict:
+# nem12_mappings.json by (bucket, key), kept between warm invocations
+nem12MappingsCache = {}
+NEM12_MAPPINGS_STATS = ["nem12MappingsHits", "nem12MappingsMisses", "nem12MappingsRefreshes", "nem12MappingsNotModified", "nem12MappingsStale"]
+
+def read_nem12_mappings(bucket_name: str, object_key: str = "nem12_mappings.json", stats: dict = None) -> dict:
+    """Read the NEM12 mappings, cached across warm invocations.
+
+    A cached copy is used as is for NEM12_MAPPINGS_TTL_SECONDS, then
+    revalidated with a conditional GET on its ETag. If S3 can't be read the
+    last good copy is used. Hits, misses and refreshes and the time taken
+    are added to stats.
+    """
+    if stats is None:
+        stats = {}
+    start = time.perf_counter()
+    try:
+        return read_nem12_mappings_cached(bucket_name, object_key, stats)
+    finally:
+        stats["nem12MappingsLoadSeconds"] = round(stats.get("nem12MappingsLoadSeconds", 0) + time.perf_counter() - start, 3)
+
+def read_nem12_mappings_cached(bucket_name, object_key, stats):
+    cacheKey = (bucket_name, object_key)
+    cached = nem12MappingsCache.get(cacheKey)
+    if cached is not None and time.monotonic() - cached["checkedAt"] < common.NEM12_MAPPINGS_TTL_SECONDS:
+        stats["nem12MappingsHits"] = stats.get("nem12MappingsHits", 0) + 1
+        return cached["mappings"]
+
+    if cached is None:
+        stats["nem12MappingsMisses"] = stats.get("nem12MappingsMisses", 0) + 1
+    else:
+        stats["nem12MappingsRefreshes"] = stats.get("nem12MappingsRefreshes", 0) + 1
     try:
-        obj = s3_resource.Object(bucket_name, object_key)
-        content = obj.get()["Body"].read().decode("utf-8")
-        return json.loads(content)
+        s3_client = get_client("s3")
+        if cached is None:
+            response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+        else:
+            try:
+                response = s3_client.get_object(Bucket=bucket_name, Key=object_key, IfNoneMatch=cached["etag"])
+            except ClientError as e:
+                if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") != 304:
+                    raise
+                stats["nem12MappingsNotModified"] = stats.get("nem12MappingsNotModified", 0) + 1
+                cached["checkedAt"] = time.monotonic()
+                return cached["mappings"]
+        content = response["Body"].read().decode("utf-8")
+        mappings = json.loads(content)
+        nem12MappingsCache[cacheKey] = {"mappings": mappings, "etag": response.get("ETag"), "checkedAt": time.monotonic()}
+        return mappings
     except Exception as e:
         error_log.log(f"Failed to read NEM12 mappings from {bucket_name}/{object_key}: {e}")
+        if cached is not None:
+            stats["nem12MappingsStale"] = stats.get("nem12MappingsStale", 0) + 1
+            return cached["mappings"]
         return None
 
-def download_files_to_tmp(file_list, tmp_files_folder_path):
-    local_paths = []
-
-    for f in file_list:
-        bucket = f["bucket"]
+def download_file_to_tmp(f, tmp_files_folder_path):
+    """Download one file entry, returning its local path or None on failure."""
+    bucket = f["bucket"]
 
-        # Always decode key before using with boto3
-        key = unquote(f["file_name"].replace("+", "%20"))
-        
+    # Always decode key before using with boto3
+    key = unquote(f["file_name"].replace("+", "%20"))
 
-        file_name = os.path.basename(key)
-        local_path = os.path.join(tmp_files_folder_path, file_name)
+    # Each file gets its own folder, so files downloaded ahead can't
+    # overwrite one with the same name that is still being parsed
+    file_name = os.path.basename(key)
+    local_path = os.path.join(tempfile.mkdtemp(dir=tmp_files_folder_path), file_name)
 
-        execution_log.log(f"Downloading s3://{bucket}/{key} -> {local_path}")
+    execution_log.log(f"Downloading s3://{bucket}/{key} -> {local_path}")
 
-        try:
-            s3_resource.Bucket(bucket).download_file(key, local_path)
-            local_paths.append(local_path)
+    try:
+        get_client("s3").download_file(bucket, key, local_path)
+        return local_path
 
-        except Exception as e:
-            error_log.log(
-                f"Downloading {key} Failed. File Potentially already processed. Error: {e}"
-            )
-            continue
-    return local_paths
+    except Exception as e:
+        error_log.log(
+            f"Downloading {key} Failed. File Potentially already processed. Error: {e}"
+        )
+        return None
 
+def fetch_file(f, tmp_files_folder_path):
+    """Prepare a file entry for parsing, returning (local_path, stream).
+
+    Large files are parsed from an S3 stream, opened when parsing starts,
+    and local_path is only written if a parser needs random access. Other
+    files (and zip archives, which need random access) are downloaded and
+    stream is None. local_path is None if the download failed.
+    """
+    key = unquote(f["file_name"].replace("+", "%20"))
+    size = f.get("size")
+    if size is not None and size > common.STREAM_THRESHOLD_BYTES and not key.lower().endswith(".zip"):
+        local_path = os.path.join(tempfile.mkdtemp(dir=tmp_files_folder_path), os.path.basename(key))
+        return local_path, S3ObjectStream(get_client("s3"), f["bucket"], key)
+    return download_file_to_tmp(f, tmp_files_folder_path), None
 
 def move_s3_file(bucket_name: str, source_key: str, dest_prefix: str):
     #source_key = unquote(source_key.replace("+", "%20"))
@@ -77,12 +134,12 @@ def move_s3_file(bucket_name: str, source_key: str, dest_prefix: str):
     dest_key = f"{dest_prefix.rstrip('/')}/{file_name}"
 
     try:
-        bucket = s3_resource.Bucket(bucket_name)
+        uploader = get_shared_uploader()
 
         copy_source = {"Bucket": bucket_name, "Key": source_key}
-        bucket.Object(dest_key).copy(copy_source)
+        uploader.call("copy_object", Bucket=bucket_name, Key=dest_key, CopySource=copy_source)
 
-        bucket.Object(source_key).delete()
+        uploader.call("delete_object", Bucket=bucket_name, Key=source_key)
 
         return dest_key
 
@@ -110,19 +167,68 @@ def metricsDictPopulateValues(metricsDict, key, ftpFilesCount, validProcessedFil
     metricsDict[key]["calculatedEmailFilesCount"] = metricsDict[key]["calculatedTotalFilesCount"] - metricsDict[key]["ftpFilesCount"]
     metricsDict[key]["errorExecutionCount"] = metricsDict[key]["errorExecutionCount"] + errorExecutionCount
                                           
-def getNem12Unit(df):
-    cols = []
-    for col in df.columns:
-        if(col !=df.index.name):
-            cols.append(col)
-        
-    if(len(cols) != 1):
-        print(cols)
-        return -1
-        
-    else:
-        return str.lower(cols[0].split("_")[1])
-                                                
+def metricsDictAddStageTimings(metricsDict, key, stageTimings):
+    dailyInitializeMetricsDict(metricsDict, key)
+    for stage, seconds in stageTimings.items():
+        metricsDict[key][stage + "Seconds"] = round(metricsDict[key].get(stage + "Seconds", 0) + seconds, 3)
+
+def metricsDictAddStageStats(metricsDict, key, stageStats):
+    dailyInitializeMetricsDict(metricsDict, key)
+    for stats in stageStats:
+        metricsDict[key].update(stats.metrics())
+
+def iter_file_data_frames(fileName, nem12_mappings=None, fileStream=None):
+    """Yield (name, df) for each data block in a file as it is parsed.
+
+    NEM12 files are streamed block by block; anything the NEM reader
+    can't open at all is handed to the non-NEM parsers instead.
+    When nem12_mappings is given, NEM channels without a mapping are
+    skipped by the reader rather than parsed.
+    When fileStream is given the NEM reader reads the S3 stream directly.
+    The non-NEM parsers need random access, so for them the stream is
+    restarted from its kept start and written to fileName first.
+    """
+    dfs = iter_data_frames(fileStream.open() if fileStream is not None else fileName, channel_filter=nem12_mappings)
+    try:
+        firstDf = next(dfs, None)
+    except:
+        if fileStream is not None:
+            fileStream.save(fileName)
+        yield from nonNemParsersGetDf(fileName, common.PARSE_ERROR_LOG_GROUP)
+        return
+    if firstDf is not None:
+        yield from chain([firstDf], dfs)
+
+def scanFileMonitorPoints(fileName):
+    """Monitor point names (NMI-suffix) in a file, read cheaply.
+
+    Only the 200/250 rows of NEM files, or the identifier columns of the
+    other formats, are read. None when they can't be determined this way.
+    """
+    try:
+        return {nmi + "-" + suffix for nmi, suffix in channels_in_file(fileName)}
+    except Exception:
+        return nonNemMonitorPointNames(fileName)
+
+def settleFileUploads(fileName, uploads, stageTimings) -> bool:
+    """Wait for a processed file's uploads, then move it to newP/.
+
+    Returns False, leaving the file in newTBP/ to be retried, if any of
+    its uploads failed.
+    """
+    stageStart = time.perf_counter()
+    try:
+        wait_for_uploads(uploads)
+    except Exception as e:
+        error_log.log(f"Uploading output of {fileName} Failed with Error: {e}")
+        return False
+    finally:
+        stageTimings["parseAndUpload"] += time.perf_counter() - stageStart
+    stageStart = time.perf_counter()
+    move_s3_file(BUCKET_NAME, fileName, common.PROCESSED_DIR)
+    stageTimings["move"] += time.perf_counter() - stageStart
+    return True
+
 def parseAndWriteData(tbp_files=None):
     tmp_dir = tempfile.gettempdir()
     tmp_files_folder_name = str(uuid.uuid4())
@@ -139,12 +245,27 @@ def parseAndWriteData(tbp_files=None):
         logsDict = {}
         metricsDict = {}
 
-        nem12_mappings = read_nem12_mappings(BUCKET_NAME)
+        nem12MappingsStats = dict.fromkeys(NEM12_MAPPINGS_STATS, 0)
+        nem12_mappings = read_nem12_mappings(BUCKET_NAME, stats=nem12MappingsStats)
 
         if nem12_mappings is None:
             raise Exception("Failed to read NEM12 mappings from S3.")
 
-        download_files_to_tmp(tbp_files, tmp_files_folder_path)
+        # Seconds spent in each stage, reported in the metrics log
+        stageTimings = {"download": 0.0, "preScan": 0.0, "parseAndUpload": 0.0, "move": 0.0}
+
+        # Files are downloaded on a background thread a few files ahead of
+        # the one being parsed, while its output uploads on the uploader's
+        # pool. Both queues are bounded, so memory and /tmp use stay bounded.
+        uploader = get_shared_uploader()
+        downloadStats = StageStats("download")
+        uploader.stage_stats = StageStats("upload")
+        downloadedFiles = prefetch(
+            tbp_files,
+            lambda f: fetch_file(f, tmp_files_folder_path),
+            common.DOWNLOAD_PREFETCH_FILES,
+            downloadStats,
+        )
         
         validProcessedFilesCount = 0
         irrevFilesCount = 0
@@ -152,97 +273,202 @@ def parseAndWriteData(tbp_files=None):
         processedMonitorPointsCount = 0
         totalMonitorPointsCount = 0
         ftpFilesCount = 0
-        
+        errorExecutionCount = 0
+        # Files that failed part way through and should be retried
+        failedFiles = []
+        # (fileName, uploads, tbp_file) of the last processed file. Its
+        # uploads are only waited on, and it is only moved, once the next
+        # file has been parsed, so they overlap that file's parse
+        unsettledFile = None
+
+        # In batch output mode all files share one writer, and processed
+        # files are only moved once its last object has been uploaded
+        batchWriter = None
+        batchProcessedFiles = []
+        if common.SENSOR_OUTPUT_MODE == "batch":
+            batchWriter = SensorDataWriter(uploader, "batch", common.SENSOR_OUTPUT_TARGET_ROWS, common.SENSOR_OUTPUT_TARGET_BYTES, common.SENSOR_OUTPUT_GZIP)
+        # Serialises the per monitor point objects, reusing its buffer
+        encoder = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS, compressed=common.SENSOR_OUTPUT_GZIP)
+
         nmiDataStreamSuffix = ["A","B","C","D","E","F","J","K","L","P","Q","R","S","T","U","G","H","Y","M","W","V","Z"]
         nmiDataStreamChannel = ["1","2","3","4","5","6","7","8","9","A","B","C","D","E","F","G","H","I","J","K","L","M","N","O","P","Q","R","S","T","U","V","W","X","Y","Z"]
 
-        nmiDataStreamCombinedSuffix = []
+        nmiDataStreamCombinedSuffix = {i + j for i in nmiDataStreamSuffix for j in nmiDataStreamChannel}
         
         c = 0
         fileSize = 1
         
-        neptuneIds = []
-
-        for i in nmiDataStreamSuffix:
-            for j in nmiDataStreamChannel:
-                nmiDataStreamCombinedSuffix.append(i+j)
-        toBeProcessedFiles = os.listdir(tmp_files_folder_path)
-        for fileName in toBeProcessedFiles:
-            fileName = tmp_files_folder_path + "/" + fileName
+        for tbp_file, (fileName, fileStream) in downloadedFiles:
+            if fileName is None:
+                continue
             c = c + 1
             processingDict = []            
-            dfs = None
+            neptuneIds = []
+            # Output is only uploaded once the whole file has parsed, so a
+            # file that fails part way through leaves nothing behind in
+            # hudibucketsrc. Per monitor point objects are spilled to /tmp
+            # here, the writers spill their rows until commit().
+            fileObjects = SpillBuffer()
             try:
-                dfs = output_as_data_frames(fileName, common.PARSE_ERROR_LOG_GROUP)
-            except:
-                try:
-                    dfs = nonNemParsersGetDf(fileName, common.PARSE_ERROR_LOG_GROUP)
-                except:
+                if fileStream is not None:
+                    try:
+                        fileStream.start()
+                    except Exception as e:
+                        error_log.log(
+                            f"Downloading {fileStream.key} Failed. File Potentially already processed. Error: {e}"
+                        )
+                        continue
+
+                # Files without any mapped monitor points skip the full parse.
+                # Streamed files aren't scanned, the filtered parse does the same.
+                stageStart = time.perf_counter()
+                monitorPoints = scanFileMonitorPoints(fileName) if fileStream is None else None
+                stageTimings["preScan"] += time.perf_counter() - stageStart
+                if monitorPoints is not None and not any(
+                    mp in nem12_mappings and mp.split("-")[-1] in nmiDataStreamCombinedSuffix
+                    for mp in monitorPoints
+                ):
+                    stageStart = time.perf_counter()
+                    move_s3_file(BUCKET_NAME, fileName, common.IRREVFILES_DIR)
+                    stageTimings["move"] += time.perf_counter() - stageStart
+                    irrevFilesCount = irrevFilesCount + 1
+                    continue
+
+                stageStart = time.perf_counter()
+                writer = batchWriter
+                if common.SENSOR_OUTPUT_MODE == "file":
+                    writer = SensorDataWriter(uploader, Path(fileName).stem, common.SENSOR_OUTPUT_TARGET_ROWS, common.SENSOR_OUTPUT_TARGET_BYTES, common.SENSOR_OUTPUT_GZIP)
+                dfs = iter_file_data_frames(fileName, nem12_mappings, fileStream)
+                fileParseError = False
+                fileMonitorPointsCount = 0
+
+                # Blocks are transformed and serialised as they are parsed so
+                # only one frame is held in memory at a time.
+                while True:
+                    try:
+                        df = next(dfs, None)
+                    except:
+                        fileParseError = True
+                        break
+                    if df is None:
+                        break
+                    bufferNMI, bufferDF = df
+                    # All data stream columns of the block are reshaped at once
+                    channels, sensorDF = sensorDataLongFormat(bufferNMI, bufferDF, nem12_mappings, nmiDataStreamCombinedSuffix)
+                    neptuneIds.extend(neptuneId for _, neptuneId, _ in channels)
+                    if sensorDF is None:
+                        continue
+                    mappedPoints = [monitorPointName for monitorPointName, neptuneId, _ in channels if neptuneId is not None]
+                    if writer is not None:
+                        writer.add(sensorDF)
+                    else:
+                        # One object per monitor point, each a run of the block's rows
+                        rows = len(bufferDF)
+                        for k, monitorPointName in enumerate(mappedPoints):
+                            fileObjects.append(
+                                encoder.encode(sensorDF.iloc[k * rows:(k + 1) * rows]),
+                                sensorDataObjectKey(monitorPointName, encoder.compressed),
+                            )
+                    fileMonitorPointsCount += len(mappedPoints)
+
+                if unsettledFile is not None:
+                    settling, unsettledFile = unsettledFile, None
+                    if not settleFileUploads(*settling[:2], stageTimings):
+                        failedFiles.append(settling[2])
+                        validProcessedFilesCount = validProcessedFilesCount - 1
+                        errorExecutionCount = errorExecutionCount + 1
+
+                if fileParseError:
+                    if writer is not None:
+                        writer.discard()
+                    stageTimings["parseAndUpload"] += time.perf_counter() - stageStart
+                    stageStart = time.perf_counter()
                     logsDict["Bad File: " + fileName] = "[" + timestampNow + "]"
                     move_s3_file(BUCKET_NAME, fileName, common.PARSE_ERR_DIR)
                     parseErrFilesCount = parseErrFilesCount + 1
+                    stageTimings["move"] += time.perf_counter() - stageStart
                     continue
-                    
-            for df in dfs:
-                bufferNMI, bufferDF = df
-                for reqCol in filter(lambda x: x.split("_")[0] in nmiDataStreamCombinedSuffix, bufferDF):
-                    monitorPointName = bufferNMI + "-" + reqCol.split("_")[0]
-                    nemDataType = reqCol.split("_")[0][0]
-
-                    fieldNames = ['t_start', reqCol]
-                    if 't_start' not in bufferDF.columns and bufferDF.index.name == 't_start':
-                        bufferDF = bufferDF.reset_index()
-                    eachBufferDF = bufferDF[fieldNames].copy()
-
-                    # Ensure proper datetime index
-                    eachBufferDF = eachBufferDF.set_index('t_start')
-                    eachBufferDF.index.name = 't_start'
-
-                    nem12UnitName = getNem12Unit(eachBufferDF)
-
-                    neptuneId = nem12_mappings.get(monitorPointName,None)
-                    neptuneIds.append(neptuneId)
-                    if neptuneId is not None:
-                        gems2BufferDF = bufferDF[fieldNames].copy()
-                        gems2BufferDF['sensorId'] = neptuneId
-                        gems2BufferDF['unit'] = nem12UnitName
-                        gems2BufferDF = gems2BufferDF.rename(columns={"t_start": "ts", reqCol: "val"})
-                        gems2BufferDF['its'] = gems2BufferDF['ts']
-                        gems2BufferDF = gems2BufferDF[['sensorId', 'ts', 'val', 'unit', 'its']]
-
-                        # Format timestamps properly
-                        gems2BufferDF['ts'] = gems2BufferDF['ts'].dt.strftime('%Y-%m-%d %H:%M:%S')
-                        gems2BufferDF['its'] = gems2BufferDF['its'].dt.strftime('%Y-%m-%d %H:%M:%S')
-                        s3_resource.Object(
-                            "hudibucketsrc",
-                            "sensorDataFiles/"
-                            + monitorPointName
-                            + pd.Timestamp.now().strftime('%Y_%b_%dT%H_%M_%S_%f')
-                            + str(random.randint(1, 1000000))
-                            + ".csv"
-                        ).put(Body=gems2BufferDF.to_csv(index=False))
-
-                        processedMonitorPointsCount += 1
-            neptuneIds = [x for x in neptuneIds if x is not None]
-            if(len(neptuneIds)!=0):
-                totalMonitorPointsCount = totalMonitorPointsCount + len(neptuneIds)
-                move_s3_file(BUCKET_NAME, fileName, common.PROCESSED_DIR)
-                validProcessedFilesCount = validProcessedFilesCount + 1
+
+                fileUploads = []
+                if writer is not None:
+                    writer.commit()
+                    if writer is not batchWriter:
+                        fileUploads = writer.finish()
+                else:
+                    fileUploads = [
+                        uploader.put_object(Bucket="hudibucketsrc", Key=key, Body=body)
+                        for body, key in fileObjects.items()
+                    ]
+                    fileObjects.clear()
+                processedMonitorPointsCount += fileMonitorPointsCount
+                stageTimings["parseAndUpload"] += time.perf_counter() - stageStart
+                stageStart = time.perf_counter()
+
+                neptuneIds = [x for x in neptuneIds if x is not None]
+                if(len(neptuneIds)!=0):
+                    totalMonitorPointsCount = totalMonitorPointsCount + len(neptuneIds)
+                    if batchWriter is not None:
+                        batchProcessedFiles.append((fileName, tbp_file))
+                    else:
+                        unsettledFile = (fileName, fileUploads, tbp_file)
+                    validProcessedFilesCount = validProcessedFilesCount + 1
             
-            else:
-                move_s3_file(BUCKET_NAME, fileName, common.IRREVFILES_DIR)
-                irrevFilesCount = irrevFilesCount + 1
+                else:
+                    move_s3_file(BUCKET_NAME, fileName, common.IRREVFILES_DIR)
+                    irrevFilesCount = irrevFilesCount + 1
+                stageTimings["move"] += time.perf_counter() - stageStart
+            except Exception as e:
+                # Left in newTBP/ so the file's messages are retried
+                err = traceback.format_exc()
+                error_log.log(f"Processing {fileName} Failed with Error: {e}\n{err}")
+                if batchWriter is not None:
+                    # The file is retried, so none of its rows go in the batch
+                    batchWriter.discard()
+                failedFiles.append(tbp_file)
+                errorExecutionCount = errorExecutionCount + 1
+            finally:
+                fileObjects.close()
+                if fileStream is not None:
+                    fileStream.close()
+                shutil.rmtree(os.path.dirname(fileName), ignore_errors=True)
+        stageTimings["download"] = downloadStats.busy_seconds
+
+        if unsettledFile is not None:
+            if not settleFileUploads(*unsettledFile[:2], stageTimings):
+                failedFiles.append(unsettledFile[2])
+                validProcessedFilesCount = validProcessedFilesCount - 1
+                errorExecutionCount = errorExecutionCount + 1
+
+        if batchWriter is not None:
+            try:
+                stageStart = time.perf_counter()
+                batchWriter.close()
+                stageTimings["parseAndUpload"] += time.perf_counter() - stageStart
+                stageStart = time.perf_counter()
+                for fileName, tbp_file in batchProcessedFiles:
+                    move_s3_file(BUCKET_NAME, fileName, common.PROCESSED_DIR)
+                stageTimings["move"] += time.perf_counter() - stageStart
+            except Exception as e:
+                # Nothing has been moved, so every processed file is retried
+                err = traceback.format_exc()
+                error_log.log(f"Uploading batch output Failed with Error: {e}\n{err}")
+                failedFiles.extend(tbp_file for fileName, tbp_file in batchProcessedFiles)
+                validProcessedFilesCount = validProcessedFilesCount - len(batchProcessedFiles)
+                errorExecutionCount = errorExecutionCount + 1
         
         for key,value in logsDict.items():
             runtime_error_log.log(key + " at " + value)
-        metricsDictPopulateValues(metricsDict, metricsFileKey, ftpFilesCount, validProcessedFilesCount, parseErrFilesCount, irrevFilesCount, totalMonitorPointsCount, processedMonitorPointsCount, 0)
+        metricsDictPopulateValues(metricsDict, metricsFileKey, ftpFilesCount, validProcessedFilesCount, parseErrFilesCount, irrevFilesCount, totalMonitorPointsCount, processedMonitorPointsCount, errorExecutionCount)
+        metricsDictAddStageTimings(metricsDict, metricsFileKey, stageTimings)
+        metricsDictAddStageStats(metricsDict, metricsFileKey, [downloadStats, uploader.stage_stats])
+        metricsDict[metricsFileKey].update(nem12MappingsStats)
         metrics_log.log(json.dumps(metricsDict[metricsFileKey]))        
         processingEndTime = pd.Timestamp.now().tz_localize('UTC').tz_convert('Australia/Sydney').isoformat()
         execution_log.log("Script Finished Running at: " + processingEndTime)
         shutil.rmtree(tmp_files_folder_path, ignore_errors=True)
         
         
-        return 1
+        return failedFiles
         
     except Exception as e:
         err = traceback.format_exc()
@@ -250,33 +476,52 @@ def parseAndWriteData(tbp_files=None):
         metricsDictPopulateValues(metricsDict, metricsFileKey, 0, 0, 0, 0, 0, 0, 1)
         metrics_log.log(json.dumps(metricsDict[metricsFileKey]))
         shutil.rmtree(tmp_files_folder_path, ignore_errors=True)
+        return list(tbp_files)
     
 def lambda_handler(event, context):
-    tbp_files = []
+    try:
+        return process_sqs_batch(event)
+    finally:
+        # Buffered log events are sent before the container is frozen
+        flush_all_loggers()
+
+def process_sqs_batch(event):
+    # Each file is processed once per batch, however many messages refer to it
+    messageIdsByFile = {}
+    fileSizes = {}
+    # Messages that couldn't be read are returned to the queue, and end up
+    # in its dead-letter queue rather than being deleted
+    failedMessageIds = []
     for record in event["Records"]:
         try:
             message_body = json.loads(record["body"])
-            s3_event = message_body["Records"][0]
-
-            bucket_name = s3_event["s3"]["bucket"]["name"]
-            file_name   = s3_event["s3"]["object"]["key"]
-            tbp_files.append({
-                "bucket": bucket_name,
-                "file_name": file_name,
-            })
-
-            parseAndWriteData(tbp_files)
+            if message_body.get("Event") == "s3:TestEvent":
+                # Sent by S3 when the notification is configured, there is no file
+                continue
+            for s3_event in message_body["Records"]:
+                bucket_name = s3_event["s3"]["bucket"]["name"]
+                file_name   = s3_event["s3"]["object"]["key"]
+                messageIdsByFile.setdefault((bucket_name, file_name), []).append(record["messageId"])
+                fileSizes[(bucket_name, file_name)] = s3_event["s3"]["object"].get("size")
 
         except Exception as e:
             error_log.log(f"Error processing record: {e}")
+            if "messageId" in record and record["messageId"] not in failedMessageIds:
+                failedMessageIds.append(record["messageId"])
             continue
 
-    return {
-        "statusCode": 200,
-        "body": "Successfully processed files."
-    }
+    tbp_files = [
+        {"bucket": bucket_name, "file_name": file_name, "size": fileSizes[(bucket_name, file_name)]}
+        for bucket_name, file_name in messageIdsByFile
+    ]
+    failedFiles = parseAndWriteData(tbp_files) if tbp_files else []
+
+    # Only the messages of failed files are returned to the queue
+    for f in failedFiles:
+        for messageId in messageIdsByFile[(f["bucket"], f["file_name"])]:
+            if messageId not in failedMessageIds:
+                failedMessageIds.append(messageId)
 
     return {
-        "statusCode": 200,
-        "body": "Successfully processed files."
+        "batchItemFailures": [{"itemIdentifier": messageId} for messageId in failedMessageIds]
     }
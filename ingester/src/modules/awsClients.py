@@ -0,0 +1,47 @@
+import threading
+import boto3
+from botocore.config import Config
+
+# Enough connections for the uploader's pool plus the download and
+# logging threads sharing a client
+MAX_POOL_CONNECTIONS = 50
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=60,
+)
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_session() -> boto3.session.Session:
+    """The boto3 session every client is created from."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = boto3.session.Session()
+        return _session
+
+
+def get_client(service_name: str, region_name: str = None, **config_overrides):
+    """A client shared across threads and warm invocations.
+
+    Clients use CLIENT_CONFIG, updated by any config_overrides (e.g.
+    retries), and one is created per distinct service, region and overrides.
+    """
+    key = (service_name, region_name, repr(sorted(config_overrides.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    session = get_session()
+    with _lock:
+        # Sessions aren't thread safe, so clients are created one at a time
+        if key not in _clients:
+            config = CLIENT_CONFIG.merge(Config(**config_overrides)) if config_overrides else CLIENT_CONFIG
+            _clients[key] = session.client(service_name, region_name=region_name, config=config)
+        return _clients[key]
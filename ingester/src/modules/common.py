@@ -1,6 +1,14 @@
-import boto3
+import os
+import sys
+import logging
+import atexit
+import threading
+import weakref
+import importlib.util
 import time
 from datetime import datetime
+from itertools import groupby
+from modules.awsClients import get_client
 
 PARSE_ERROR_LOG_GROUP = "sbm-ingester-parse-error-log"
 RUNTIME_ERROR_LOG_GROUP = "sbm-ingester-runtime-error-log"
@@ -12,26 +20,111 @@ PARSE_ERR_DIR = "newParseErr/"
 IRREVFILES_DIR = "newIrrevFiles/"
 PROCESSED_DIR = "newP/"
 
+# Sensor data output: one object per monitor point ("monitorPoint"), or
+# consolidated objects per file ("file") or per SQS batch ("batch")
+SENSOR_OUTPUT_MODE = os.environ.get("sensorOutputMode", "monitorPoint")
+SENSOR_OUTPUT_TARGET_ROWS = int(os.environ.get("sensorOutputTargetRows", "1000000"))
+SENSOR_OUTPUT_TARGET_BYTES = int(os.environ.get("sensorOutputTargetBytes", str(32 * 1024 * 1024)))
+# Sensor data objects are gzip-compressed .csv.gz when "true"
+SENSOR_OUTPUT_GZIP = os.environ.get("sensorOutputGzip", "false").lower() == "true"
+
+# Cached nem12_mappings.json is revalidated with S3 once it is this old
+NEM12_MAPPINGS_TTL_SECONDS = float(os.environ.get("nem12MappingsTtlSeconds", "300"))
+
+# Files downloaded ahead of the one being parsed
+DOWNLOAD_PREFETCH_FILES = int(os.environ.get("downloadPrefetchFiles", "2"))
+# Files larger than this are parsed from the S3 stream instead of /tmp
+STREAM_THRESHOLD_BYTES = int(os.environ.get("streamThresholdBytes", str(16 * 1024 * 1024)))
+
+# put_log_events limits, each event counts its message bytes plus 26
+LOG_BATCH_MAX_EVENTS = 10000
+LOG_BATCH_MAX_BYTES = 1048576
+LOG_EVENT_OVERHEAD_BYTES = 26
+LOG_EVENT_MAX_BYTES = 256 * 1024 - LOG_EVENT_OVERHEAD_BYTES
+# Buffered log events are sent at least this often
+LOG_FLUSH_INTERVAL_SECONDS = float(os.environ.get("logFlushIntervalSeconds", "2"))
+# Events past this many waiting to be sent are dropped rather than buffered
+LOG_MAX_BUFFERED_EVENTS = 100000
+
+log = logging.getLogger(__name__)
+
+_loggers = weakref.WeakSet()
+
+
+def lazy_import(name: str):
+    """Import a module when one of its attributes is first used.
+
+    Keeps heavy libraries such as pandas out of the Lambda init phase.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def flush_all_loggers():
+    """Send the buffered events of every CloudWatchLogger, e.g. before the handler returns."""
+    for logger in list(_loggers):
+        logger.flush()
+
+
+atexit.register(flush_all_loggers)
+
+
 class CloudWatchLogger:
-    def __init__(self, log_group: str, region_name: str = "ap-southeast-2"):
+    """Log messages to a CloudWatch log group, in one stream per UTC day.
+
+    log() only buffers the message, so it never waits on CloudWatch. A
+    background thread sends the buffered events in batches of up to the
+    put_log_events limits every flush_interval seconds, or as soon as a
+    full batch is waiting. flush() sends everything buffered so far.
+
+    Nothing is sent when a logger is created: the shared logs client and
+    the day's log stream are only created when the first events are sent.
+    """
+
+    def __init__(self, log_group: str, region_name: str = "ap-southeast-2", client=None, flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS):
         self.log_group = log_group
-        self.client = boto3.client("logs", region_name=region_name)
+        self.region_name = region_name
+        self._client = client
         self.sequence_token = None
         self.current_stream = None
-        self._update_stream()
+        self.flush_interval = flush_interval
+        self.dropped_events = 0
+        self._events = []
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        _loggers.add(self)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client("logs", region_name=self.region_name)
+        return self._client
 
-    def _get_daily_stream_name(self) -> str:
-        """Return today's log stream name (UTC)."""
-        return datetime.utcnow().strftime("day-%Y-%m-%d")
+    def _get_daily_stream_name(self, timestamp: int = None) -> str:
+        """Return the log stream name (UTC) for a timestamp in ms, today by default."""
+        if timestamp is None:
+            return datetime.utcnow().strftime("day-%Y-%m-%d")
+        return datetime.utcfromtimestamp(timestamp / 1000).strftime("day-%Y-%m-%d")
 
-    def _update_stream(self):
+    def _update_stream(self, stream_name: str = None):
         """Ensure we're using the correct log stream for today."""
-        stream_name = self._get_daily_stream_name()
+        if stream_name is None:
+            stream_name = self._get_daily_stream_name()
         if stream_name != self.current_stream:
             # New day or first initialization
+            self._ensure_stream(stream_name)
             self.current_stream = stream_name
             self.sequence_token = None
-            self._ensure_stream(stream_name)
 
     def _ensure_stream(self, stream_name: str):
         """Create the log stream if it doesn't exist."""
@@ -44,16 +137,78 @@ class CloudWatchLogger:
             pass
 
     def log(self, message: str):
-        self._update_stream()
-
         timestamp = int(round(time.time() * 1000))
-        kwargs = {
-            "logGroupName": self.log_group,
-            "logStreamName": self.current_stream,
-            "logEvents": [{"timestamp": timestamp, "message": message}]
-        }
-        if self.sequence_token:
-            kwargs["sequenceToken"] = self.sequence_token
-
-        response = self.client.put_log_events(**kwargs)
-        self.sequence_token = response.get("nextSequenceToken")
\ No newline at end of file
+        size = len(message.encode("utf-8"))
+        if size > LOG_EVENT_MAX_BYTES:
+            message = message.encode("utf-8")[:LOG_EVENT_MAX_BYTES].decode("utf-8", "ignore")
+            size = len(message.encode("utf-8"))
+
+        with self._lock:
+            if len(self._events) >= LOG_MAX_BUFFERED_EVENTS:
+                self.dropped_events += 1
+                return
+            self._events.append((timestamp, message, size))
+            self._bytes += size + LOG_EVENT_OVERHEAD_BYTES
+            full = len(self._events) >= LOG_BATCH_MAX_EVENTS or self._bytes >= LOG_BATCH_MAX_BYTES
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cloudwatch-logger", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Send every buffered event now."""
+        with self._send_lock:
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return
+                self._send_batch(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                log.warning("CloudWatchLogger %s: flush failed: %s", self.log_group, e)
+
+    def _take_batch(self) -> list:
+        """Remove the oldest events that fit in one put_log_events call."""
+        with self._lock:
+            count = 0
+            batch_bytes = 0
+            for _, _, size in self._events:
+                if count == LOG_BATCH_MAX_EVENTS or batch_bytes + size + LOG_EVENT_OVERHEAD_BYTES > LOG_BATCH_MAX_BYTES:
+                    break
+                count += 1
+                batch_bytes += size + LOG_EVENT_OVERHEAD_BYTES
+            batch = self._events[:count]
+            del self._events[:count]
+            self._bytes -= batch_bytes
+        # Events must be in chronological order, and within one day's stream
+        batch.sort(key=lambda event: event[0])
+        return batch
+
+    def _send_batch(self, batch: list):
+        for stream_name, events in groupby(batch, key=lambda event: self._get_daily_stream_name(event[0])):
+            events = list(events)
+            try:
+                self._update_stream(stream_name)
+                kwargs = {
+                    "logGroupName": self.log_group,
+                    "logStreamName": self.current_stream,
+                    "logEvents": [{"timestamp": timestamp, "message": message} for timestamp, message, _ in events]
+                }
+                if self.sequence_token:
+                    kwargs["sequenceToken"] = self.sequence_token
+
+                response = self.client.put_log_events(**kwargs)
+                self.sequence_token = response.get("nextSequenceToken")
+            except Exception as e:
+                # A logging failure mustn't fail processing
+                log.warning("CloudWatchLogger %s: dropped %d events: %s", self.log_group, len(events), e)
+        if self.dropped_events:
+            log.warning("CloudWatchLogger %s: buffer full, dropped %d events", self.log_group, self.dropped_events)
+            self.dropped_events = 0
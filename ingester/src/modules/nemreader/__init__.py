@@ -9,21 +9,34 @@ import logging
 from logging import NullHandler
 
 from .version import __version__
-from .nem_reader import read_nem_file, parse_nem_file
+from .nem_reader import read_nem_file, parse_nem_file, iter_nem12_blocks
+from .lazy_reader import read_nem_file_lazy
+from .nem_index import build_nem_index, write_nem_index, load_nem_index
+from .nem_index import read_nem_file_indexed
 from .outputs import output_as_csv
 from .outputs import output_as_daily_csv
 from .outputs import nmis_in_file
+from .outputs import channels_in_file
 from .outputs import output_as_data_frames
+from .outputs import iter_data_frames
 from .outputs import flatten_and_group_rows
 
 __all__ = [
     "__version__",
     "read_nem_file",
     "parse_nem_file",
+    "iter_nem12_blocks",
+    "read_nem_file_lazy",
+    "build_nem_index",
+    "write_nem_index",
+    "load_nem_index",
+    "read_nem_file_indexed",
     "nmis_in_file",
+    "channels_in_file",
     "output_as_csv",
     "output_as_daily_csv",
     "output_as_data_frames",
+    "iter_data_frames",
     "flatten_and_group_rows"
 ]
 
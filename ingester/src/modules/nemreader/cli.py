@@ -3,6 +3,7 @@ import click
 from nemreader import nmis_in_file
 from nemreader import output_as_csv
 from nemreader import output_as_daily_csv
+from nemreader import build_nem_index, write_nem_index
 from nemreader import __version__
 
 LOG_FORMAT = "%(asctime)s %(levelname)-8s %(message)s"
@@ -37,6 +38,43 @@ def list_nmis(nemfile, verbose):
         click.echo(f"{nmi}[{suffix_str}]")
 
 
+@cli.command("index")
+@click.argument("nemfile", type=click.Path(exists=True))
+@click.option("-v", "--verbose", is_flag=True, help="Will print verbose messages.")
+@click.option(
+    "--cachedir",
+    "-c",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Save the index in this folder, named by file hash, instead of next to the file",
+)
+def index(nemfile, verbose, cachedir):
+    """ Save a byte offset index of a NEM12 file.
+
+    NEMFILE is the name of the file to index.
+    """
+    if verbose:
+        log_level = "DEBUG"
+    else:
+        log_level = "WARNING"
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    try:
+        nem_index = build_nem_index(nemfile)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    fname = write_nem_index(nemfile, cache_dir=cachedir, index=nem_index)
+    click.echo(f"Created {fname}")
+    for block in nem_index.blocks:
+        nmi_d = block.location.nmi_details
+        first = block.first_date.date() if block.first_date else "-"
+        last = block.last_date.date() if block.last_date else "-"
+        click.echo(
+            f"{nmi_d.nmi}[{nmi_d.nmi_suffix}_{nmi_d.uom}] "
+            f"{nmi_d.interval_length}min {first}..{last} "
+            f"bytes {block.location.start}-{block.location.end}"
+        )
+
+
 @cli.command("output")
 @click.argument("nemfile", type=click.Path(exists=True))
 @click.option("-v", "--verbose", is_flag=True, help="Will print verbose messages.")
@@ -0,0 +1,253 @@
+"""
+    nemreader.columnar
+    ~~~~~
+    Build and convert columnar (NumPy backed) channel readings
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from .nem_objects import ChannelBlock, EventRecord, IntervalRecord, Reading
+
+DATETIME_DTYPE = "datetime64[s]"
+CODE_DTYPE = np.int16
+
+
+@lru_cache(maxsize=16)
+def interval_offsets(interval: int, num_intervals: int) -> np.ndarray:
+    """ Offsets of each interval start from the start of the day """
+    offsets = np.arange(num_intervals) * np.timedelta64(interval, "m")
+    offsets.flags.writeable = False
+    return offsets
+
+
+class ChannelBlockBuilder:
+    """ Accumulate the interval (300) and event (400) rows of one NMI channel
+        and build a ChannelBlock from them
+    """
+
+    def __init__(self, uom: str, meter_serial_number: str):
+        self.uom = uom
+        self.meter_serial_number = meter_serial_number
+        self._t_start: List[np.ndarray] = []
+        self._t_end: List[np.ndarray] = []
+        self._values: List[np.ndarray] = []
+        self._quality: List[np.ndarray] = []
+        self._events: List[np.ndarray] = []
+        self._quality_lookup: Dict[str, int] = {}
+        self._event_lookup: Dict[Tuple[str, str], int] = {}
+
+    def _quality_code(self, quality_method: str) -> int:
+        return self._quality_lookup.setdefault(
+            quality_method, len(self._quality_lookup)
+        )
+
+    def _event_code(self, event_code: str, event_desc: str) -> int:
+        key = (event_code, event_desc)
+        return self._event_lookup.setdefault(key, len(self._event_lookup))
+
+    def add_interval_record(self, record: IntervalRecord, interval: int):
+        """ Add the values of a parsed 300 row """
+        if record.interval_date is None:
+            raise ValueError("Interval data record (300) has an invalid date")
+        values = record.interval_values
+        num_intervals = len(values)
+        t_start = np.datetime64(record.interval_date, "s") + interval_offsets(
+            interval, num_intervals
+        )
+        self._t_start.append(t_start)
+        self._t_end.append(t_start + np.timedelta64(interval, "m"))
+        self._values.append(values)
+        self._quality.append(
+            np.full(
+                num_intervals,
+                self._quality_code(record.quality_method),
+                dtype=CODE_DTYPE,
+            )
+        )
+        self._events.append(
+            np.full(
+                num_intervals,
+                self._event_code(record.reason_code, record.reason_description),
+                dtype=CODE_DTYPE,
+            )
+        )
+
+    def apply_event(self, event_record: EventRecord):
+        """ Apply a 400 row to the most recently added 300 row
+
+        Raises ValueError if there is no 300 row or the 400 row's intervals
+        are outside it, as the file is then malformed.
+        """
+        if not self._quality:
+            raise ValueError("Interval event record (400) without a 300 row")
+        num_intervals = len(self._quality[-1])
+        start, end = event_record.start_interval, event_record.end_interval
+        if start < 1 or end > num_intervals:
+            raise ValueError(
+                f"Interval event record (400) intervals {start}-{end} "
+                f"are outside the {num_intervals} intervals of its 300 row"
+            )
+        # event intervals are 1-indexed
+        intervals = slice(start - 1, end)
+        self._quality[-1][intervals] = self._quality_code(event_record.quality_method)
+        self._events[-1][intervals] = self._event_code(
+            event_record.reason_code, event_record.reason_description
+        )
+
+    def build(self) -> ChannelBlock:
+        """ Concatenate everything added so far into a ChannelBlock """
+        return ChannelBlock(
+            t_start=_concat(self._t_start, DATETIME_DTYPE),
+            t_end=_concat(self._t_end, DATETIME_DTYPE),
+            read_value=_concat(self._values, np.float64),
+            quality_codes=_concat(self._quality, CODE_DTYPE),
+            event_codes=_concat(self._events, CODE_DTYPE),
+            quality_methods=tuple(self._quality_lookup),
+            events=tuple(self._event_lookup),
+            uom=self.uom,
+            meter_serial_number=self.meter_serial_number,
+            val_start=None,
+            val_end=None,
+        )
+
+
+def _concat(arrays: List[np.ndarray], dtype) -> np.ndarray:
+    if not arrays:
+        return np.empty(0, dtype=dtype)
+    if len(arrays) == 1:
+        return arrays[0]
+    return np.concatenate(arrays)
+
+
+def concat_blocks(blocks: List[ChannelBlock]) -> ChannelBlock:
+    """ Join the blocks of a channel that was split across 200 blocks """
+    if len(blocks) == 1:
+        return blocks[0]
+    quality_lookup: Dict[str, int] = {}
+    event_lookup: Dict[Tuple[str, str], int] = {}
+    quality_codes = []
+    event_codes = []
+    for block in blocks:
+        # Re-number each block's codes against the combined lookups
+        quality_map = np.array(
+            [
+                quality_lookup.setdefault(q, len(quality_lookup))
+                for q in block.quality_methods
+            ],
+            dtype=CODE_DTYPE,
+        )
+        event_map = np.array(
+            [event_lookup.setdefault(e, len(event_lookup)) for e in block.events],
+            dtype=CODE_DTYPE,
+        )
+        quality_codes.append(quality_map[block.quality_codes])
+        event_codes.append(event_map[block.event_codes])
+    nem13 = any(b.val_start is not None for b in blocks)
+    return ChannelBlock(
+        t_start=_concat([b.t_start for b in blocks], DATETIME_DTYPE),
+        t_end=_concat([b.t_end for b in blocks], DATETIME_DTYPE),
+        read_value=_concat([b.read_value for b in blocks], np.float64),
+        quality_codes=_concat(quality_codes, CODE_DTYPE),
+        event_codes=_concat(event_codes, CODE_DTYPE),
+        quality_methods=tuple(quality_lookup),
+        events=tuple(event_lookup),
+        uom=blocks[0].uom,
+        meter_serial_number=blocks[0].meter_serial_number,
+        val_start=_concat([_val_or_nan(b.val_start, b) for b in blocks], np.float64)
+        if nem13
+        else None,
+        val_end=_concat([_val_or_nan(b.val_end, b) for b in blocks], np.float64)
+        if nem13
+        else None,
+    )
+
+
+def _val_or_nan(values: Optional[np.ndarray], block: ChannelBlock) -> np.ndarray:
+    if values is None:
+        return np.full(len(block.t_start), np.nan)
+    return values
+
+
+def _optional_floats(values: List[Optional[float]]) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+def block_from_readings(readings: List[Reading]) -> ChannelBlock:
+    """ Convert a list of Reading tuples into a ChannelBlock """
+    quality_lookup: Dict[str, int] = {}
+    event_lookup: Dict[Tuple[str, str], int] = {}
+    quality_codes = [
+        quality_lookup.setdefault(r.quality_method, len(quality_lookup))
+        for r in readings
+    ]
+    event_codes = [
+        event_lookup.setdefault((r.event_code, r.event_desc), len(event_lookup))
+        for r in readings
+    ]
+    nem13 = any(r.val_start is not None or r.val_end is not None for r in readings)
+    return ChannelBlock(
+        t_start=np.array([r.t_start for r in readings], dtype=DATETIME_DTYPE),
+        t_end=np.array([r.t_end for r in readings], dtype=DATETIME_DTYPE),
+        read_value=_optional_floats([r.read_value for r in readings]),
+        quality_codes=np.array(quality_codes, dtype=CODE_DTYPE),
+        event_codes=np.array(event_codes, dtype=CODE_DTYPE),
+        quality_methods=tuple(quality_lookup),
+        events=tuple(event_lookup),
+        uom=readings[0].uom if readings else "",
+        meter_serial_number=readings[0].meter_serial_number if readings else "",
+        val_start=_optional_floats([r.val_start for r in readings]) if nem13 else None,
+        val_end=_optional_floats([r.val_end for r in readings]) if nem13 else None,
+    )
+
+
+def _optional_value(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def block_to_readings(block: ChannelBlock) -> List[Reading]:
+    """ Convert a ChannelBlock back into a list of Reading tuples """
+    t_starts = block.t_start.astype(datetime).tolist()
+    t_ends = block.t_end.astype(datetime).tolist()
+    values = block.read_value.tolist()
+    num_readings = len(values)
+    val_starts = (
+        block.val_start.tolist() if block.val_start is not None else [None] * num_readings
+    )
+    val_ends = (
+        block.val_end.tolist() if block.val_end is not None else [None] * num_readings
+    )
+    readings = []
+    for i in range(num_readings):
+        event_code, event_desc = block.events[block.event_codes[i]]
+        readings.append(
+            Reading(
+                t_start=t_starts[i],
+                t_end=t_ends[i],
+                read_value=_optional_value(values[i]),
+                uom=block.uom,
+                meter_serial_number=block.meter_serial_number,
+                quality_method=block.quality_methods[block.quality_codes[i]],
+                event_code=event_code,
+                event_desc=event_desc,
+                val_start=None if val_starts[i] is None else _optional_value(val_starts[i]),
+                val_end=None if val_ends[i] is None else _optional_value(val_ends[i]),
+            )
+        )
+    return readings
+
+
+def block_columns(block: ChannelBlock) -> Dict[str, np.ndarray]:
+    """ Expand a ChannelBlock into per-interval DataFrame columns """
+    quality_methods = np.array(block.quality_methods, dtype=object)
+    event_codes = np.array([code for code, _ in block.events], dtype=object)
+    event_descs = np.array([desc for _, desc in block.events], dtype=object)
+    return {
+        "t_start": block.t_start.astype("datetime64[ns]"),
+        "t_end": block.t_end.astype("datetime64[ns]"),
+        "quality_method": quality_methods[block.quality_codes],
+        "event_code": event_codes[block.event_codes],
+        "event_desc": event_descs[block.event_codes],
+        "read_value": block.read_value,
+    }
@@ -0,0 +1,202 @@
+"""
+    nemreader.lazy_reader
+    ~~~~~
+    Read NEM12 files lazily, one NMI channel at a time
+"""
+
+import os
+import logging
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .nem_objects import NEMFile, BlockLocation
+from .nem_reader import COMPRESSED_OPENERS, open_row_mmap, flatten_list
+from .nem_reader import read_nem_file, read_nem_header
+from .nem_reader import parse_200_row, parse_nem12_blocks
+from .columnar import concat_blocks
+
+log = logging.getLogger(__name__)
+
+# Number of parsed NMI channels kept in memory by default
+DEFAULT_CACHED_CHANNELS = 32
+
+
+def scan_nem12_blocks(file_path: str) -> Optional[List[BlockLocation]]:
+    """ Find the NMI data details (200) rows of a NEM12 file
+
+    Only the 200 rows are parsed. Interval data is skipped over.
+
+    :returns: The location of each 200 block, or None if the file can't be
+              read by byte offset (archives, compressed or quoted files)
+    """
+    _, file_extension = os.path.splitext(file_path)
+    file_extension = file_extension.lower()
+    if file_extension == ".zip" or file_extension in COMPRESSED_OPENERS:
+        return None
+
+    with open(file_path, "rb") as nem_file:
+        mm = open_row_mmap(nem_file)
+        if mm is None:
+            return None
+        with mm:
+            starts = [0] if mm[:4] == b"200," else []
+            pos = mm.find(b"\n200,")
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = mm.find(b"\n200,", pos + 1)
+
+            locations = []
+            for start, end in zip(starts, starts[1:] + [len(mm)]):
+                line_end = mm.find(b"\n", start, end)
+                if line_end == -1:
+                    line_end = end
+                row = mm[start:line_end].rstrip(b"\r").decode("utf-8").split(",")
+                locations.append(BlockLocation(parse_200_row(row), start, end))
+    return locations
+
+
+def read_block_rows(file_path: str, location: BlockLocation) -> List[List[str]]:
+    """ Read and split the rows of a single 200 block """
+    with open(file_path, "rb") as nem_file:
+        nem_file.seek(location.start)
+        data = nem_file.read(location.end - location.start)
+    rows = []
+    for line in data.decode("utf-8").split("\n"):
+        line = line.rstrip("\r")
+        rows.append(line.split(",") if line else [])
+    return rows
+
+
+class LazyNEMReader:
+    """ Parse the blocks of a NEM12 file on first access
+
+    The most recently used channels are kept, up to max_cached_channels.
+    Evicted channels are parsed again if they are accessed again.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        locations: List[BlockLocation],
+        columnar=False,
+        max_cached_channels=DEFAULT_CACHED_CHANNELS,
+    ):
+        self.file_path = file_path
+        self.columnar = columnar
+        self.max_cached_channels = max_cached_channels
+        # block locations nested by NMI then channel
+        self.locations: Dict[str, Dict[str, List[BlockLocation]]] = {}
+        for location in locations:
+            nmi_d = location.nmi_details
+            nmi_d_suffix_with_unit = nmi_d.nmi_suffix + "_" + nmi_d.uom
+            self.locations.setdefault(nmi_d.nmi, {}).setdefault(
+                nmi_d_suffix_with_unit, []
+            ).append(location)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[Any, list]]" = OrderedDict()
+
+    def channel(self, nmi: str, channel: str) -> Tuple[Any, list]:
+        """ Readings and B2B details of a NMI channel """
+        key = (nmi, channel)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        # The same channel may be split across more than one 200 block
+        parts = []
+        b2b_details: list = []
+        for location in self.locations[nmi][channel]:
+            for _, readings, block_b2b in parse_nem12_blocks(
+                read_block_rows(self.file_path, location),
+                file_name=self.file_path,
+                columnar=self.columnar,
+                partial=True,
+            ):
+                parts.append(readings)
+                b2b_details.extend(block_b2b)
+        if self.columnar:
+            parsed = (concat_blocks(parts), b2b_details)
+        else:
+            parsed = (flatten_list(parts), b2b_details)
+
+        self._cache[key] = parsed
+        while len(self._cache) > self.max_cached_channels:
+            self._cache.popitem(last=False)
+        return parsed
+
+
+class LazyChannels(Mapping):
+    """ Channels of a NMI, parsed when they are first looked up """
+
+    def __init__(self, reader: LazyNEMReader, nmi: str, item: int):
+        self._reader = reader
+        self._nmi = nmi
+        self._item = item  # 0 for readings, 1 for B2B details
+
+    def __getitem__(self, channel: str):
+        return self._reader.channel(self._nmi, channel)[self._item]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._reader.locations[self._nmi])
+
+    def __len__(self) -> int:
+        return len(self._reader.locations[self._nmi])
+
+
+class LazyNmis(Mapping):
+    """ NMIs of a lazily read file """
+
+    def __init__(self, reader: LazyNEMReader, item: int):
+        self._reader = reader
+        self._item = item
+
+    def __getitem__(self, nmi: str) -> LazyChannels:
+        if nmi not in self._reader.locations:
+            raise KeyError(nmi)
+        return LazyChannels(self._reader, nmi, self._item)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._reader.locations)
+
+    def __len__(self) -> int:
+        return len(self._reader.locations)
+
+
+def read_nem_file_lazy(
+    file_path: str,
+    ignore_missing_header=False,
+    columnar=False,
+    max_cached_channels=DEFAULT_CACHED_CHANNELS,
+    locations: Optional[List[BlockLocation]] = None,
+) -> NEMFile:
+    """ Read in NEM file, parsing each NMI channel only when it is accessed
+
+    The file is scanned for its 200 rows up front. The interval data of a
+    channel is parsed on the first ``readings[nmi][channel]`` or
+    ``transactions[nmi][channel]`` lookup. NEM13 files and files that can't
+    be read by byte offset are read in full with read_nem_file.
+
+    :param file_path: The NEM file to process
+    :param ignore_missing_header: Whether to continue parsing if missing header.
+                                  Will assume NEM12 format.
+    :param columnar: Return a ChannelBlock of arrays per channel
+                     instead of a list of Reading tuples.
+    :param max_cached_channels: How many parsed channels to keep in memory
+    :param locations: Block locations from an index, instead of a scan
+    :returns: NEMFile with lazy readings and transactions mappings
+    """
+    header = read_nem_header(file_path, ignore_missing_header=ignore_missing_header)
+    if header.version_header == "NEM12" and locations is None:
+        locations = scan_nem12_blocks(file_path)
+    if header.version_header != "NEM12" or locations is None:
+        log.debug("Reading %s in full", file_path)
+        return read_nem_file(
+            file_path, ignore_missing_header=ignore_missing_header, columnar=columnar
+        )
+
+    reader = LazyNEMReader(
+        file_path,
+        locations,
+        columnar=columnar,
+        max_cached_channels=max_cached_channels,
+    )
+    return NEMFile(header, LazyNmis(reader, 0), LazyNmis(reader, 1))
@@ -0,0 +1,237 @@
+"""
+    nemreader.nem_index
+    ~~~~~
+    Persistent byte offset index of NEM12 files
+"""
+
+import os
+import json
+import mmap
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+from .nem_objects import NEMFile, NEMIndex, IndexedBlock, BlockLocation, NmiDetails
+from .nem_reader import read_nem_header, parse_datetime
+from .lazy_reader import scan_nem12_blocks, read_nem_file_lazy
+from .lazy_reader import DEFAULT_CACHED_CHANNELS
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".nemidx.json"
+
+
+def file_sha256(file_path: str) -> str:
+    """ Hash the content of a file """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as nem_file:
+        for chunk in iter(lambda: nem_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def index_path(file_path: str, cache_dir: Optional[str] = None, sha256=None) -> str:
+    """ Where the index of a file is kept
+
+    Next to the file by default, or named by content hash under cache_dir.
+    """
+    if cache_dir is None:
+        return file_path + INDEX_SUFFIX
+    if sha256 is None:
+        sha256 = file_sha256(file_path)
+    return os.path.join(cache_dir, sha256 + INDEX_SUFFIX)
+
+
+def _row_date(mm: mmap.mmap, line_start: int, end: int) -> Optional[datetime]:
+    """ Date of the interval data (300) row starting at line_start """
+    line_end = mm.find(b",", line_start + 4, end)
+    if line_end == -1:
+        return None
+    return parse_datetime(mm[line_start + 4 : line_end].decode("utf-8"))
+
+
+def build_nem_index(file_path: str) -> NEMIndex:
+    """ Scan a NEM12 file and index the byte range of each 200 block
+
+    Only the 200 rows and the first and last 300 row of each block are read.
+    """
+    header = read_nem_header(file_path)
+    if header.version_header != "NEM12":
+        raise ValueError(
+            "Expected a NEM12 file, got {}".format(header.version_header)
+        )
+    locations = scan_nem12_blocks(file_path)
+    if locations is None:
+        raise ValueError(f"{file_path} can't be indexed by byte offset")
+
+    blocks = []
+    with open(file_path, "rb") as nem_file, mmap.mmap(
+        nem_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mm:
+        for location in locations:
+            first = mm.find(b"\n300,", location.start, location.end)
+            last = mm.rfind(b"\n300,", location.start, location.end)
+            blocks.append(
+                IndexedBlock(
+                    location,
+                    _row_date(mm, first + 1, location.end) if first != -1 else None,
+                    _row_date(mm, last + 1, location.end) if last != -1 else None,
+                )
+            )
+
+    stat = os.stat(file_path)
+    return NEMIndex(
+        os.path.basename(file_path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        file_sha256(file_path),
+        blocks,
+    )
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _fromisoformat(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _block_to_json(block: IndexedBlock) -> Dict[str, Any]:
+    nmi_d = block.location.nmi_details
+    return {
+        "nmi_details": dict(
+            nmi_d._asdict(),
+            next_scheduled_read_date=_isoformat(nmi_d.next_scheduled_read_date),
+        ),
+        "start": block.location.start,
+        "end": block.location.end,
+        "first_date": _isoformat(block.first_date),
+        "last_date": _isoformat(block.last_date),
+    }
+
+
+def _block_from_json(block: Dict[str, Any]) -> IndexedBlock:
+    nmi_d = block["nmi_details"]
+    nmi_details = NmiDetails(
+        **dict(
+            nmi_d,
+            next_scheduled_read_date=_fromisoformat(nmi_d["next_scheduled_read_date"]),
+        )
+    )
+    return IndexedBlock(
+        BlockLocation(nmi_details, block["start"], block["end"]),
+        _fromisoformat(block["first_date"]),
+        _fromisoformat(block["last_date"]),
+    )
+
+
+def write_nem_index(
+    file_path: str, cache_dir: Optional[str] = None, index: Optional[NEMIndex] = None
+) -> str:
+    """ Build (unless given) and save the index of a NEM12 file
+
+    :param file_path: The NEM12 file to index
+    :param cache_dir: Save under this folder, named by content hash,
+                      rather than next to the file
+    :param index: A previously built index of the file
+    :returns: The index file that was created
+    """
+    if index is None:
+        index = build_nem_index(file_path)
+    output_path = index_path(file_path, cache_dir, sha256=index.sha256)
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    content = {
+        "version": INDEX_VERSION,
+        "file_name": index.file_name,
+        "size": index.size,
+        "mtime_ns": index.mtime_ns,
+        "sha256": index.sha256,
+        "blocks": [_block_to_json(block) for block in index.blocks],
+    }
+    # Write to a temporary file first so a partial index is never read
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "w") as index_file:
+        json.dump(content, index_file)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def load_nem_index(file_path: str, cache_dir: Optional[str] = None) -> Optional[NEMIndex]:
+    """ Load the saved index of a NEM12 file
+
+    :returns: The index, or None if there is no index that matches the
+              current content of the file
+    """
+    sha256 = file_sha256(file_path) if cache_dir is not None else None
+    try:
+        with open(index_path(file_path, cache_dir, sha256=sha256)) as index_file:
+            content = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if content.get("version") != INDEX_VERSION:
+        return None
+
+    stat = os.stat(file_path)
+    if content["size"] != stat.st_size:
+        return None
+    if content["mtime_ns"] != stat.st_mtime_ns:
+        # Modified (or copied) since it was indexed, check the content
+        if sha256 is None:
+            sha256 = file_sha256(file_path)
+        if content["sha256"] != sha256:
+            return None
+
+    return NEMIndex(
+        content["file_name"],
+        content["size"],
+        content["mtime_ns"],
+        content["sha256"],
+        [_block_from_json(block) for block in content["blocks"]],
+    )
+
+
+def read_nem_file_indexed(
+    file_path: str,
+    cache_dir: Optional[str] = None,
+    columnar=False,
+    max_cached_channels=DEFAULT_CACHED_CHANNELS,
+) -> NEMFile:
+    """ Read in NEM12 file lazily using its saved index
+
+    The index is built and saved first if there isn't a current one, so
+    later reads of the same file can seek straight to the NMI blocks
+    they access without scanning the rest of the file. NEM13 files and
+    files that can't be indexed by byte offset (archives, compressed or
+    quoted files) are read as read_nem_file_lazy reads them, in full.
+
+    :param file_path: The NEM12 file to process
+    :param cache_dir: Keep the index under this folder rather than next to the file
+    :param columnar: Return a ChannelBlock of arrays per channel
+                     instead of a list of Reading tuples.
+    :param max_cached_channels: How many parsed channels to keep in memory
+    :returns: NEMFile with lazy readings and transactions mappings
+    """
+    index = load_nem_index(file_path, cache_dir)
+    if index is None:
+        try:
+            index = build_nem_index(file_path)
+        except ValueError as e:
+            log.debug("Not indexing %s: %s", file_path, e)
+            return read_nem_file_lazy(
+                file_path, columnar=columnar, max_cached_channels=max_cached_channels
+            )
+        try:
+            write_nem_index(file_path, cache_dir, index=index)
+        except OSError as e:
+            log.warning("Unable to save index of %s: %s", file_path, e)
+
+    return read_nem_file_lazy(
+        file_path,
+        columnar=columnar,
+        max_cached_channels=max_cached_channels,
+        locations=[block.location for block in index.blocks],
+    )
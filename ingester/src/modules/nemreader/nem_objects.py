@@ -7,7 +7,8 @@
 
 from datetime import datetime
 from typing import NamedTuple
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Union
+import numpy as np
 
 
 class HeaderRecord(NamedTuple):
@@ -35,6 +36,32 @@ class NmiDetails(NamedTuple):
     next_scheduled_read_date: Optional[datetime]
 
 
+class BlockLocation(NamedTuple):
+    """ Byte range of a NMI data details (200) block within a file """
+
+    nmi_details: NmiDetails
+    start: int  # offset of the 200 row
+    end: int  # offset of the next 200 row, or the end of the file
+
+
+class IndexedBlock(NamedTuple):
+    """ A 200 block entry of a NEM12 file index """
+
+    location: BlockLocation
+    first_date: Optional[datetime]  # date of the first interval data (300) row
+    last_date: Optional[datetime]  # date of the last interval data (300) row
+
+
+class NEMIndex(NamedTuple):
+    """ Byte offset index of a NEM12 file """
+
+    file_name: str
+    size: int
+    mtime_ns: int
+    sha256: str
+    blocks: List[IndexedBlock]
+
+
 class Reading(NamedTuple):
     """ Represents a meter reading """
 
@@ -51,6 +78,27 @@ class Reading(NamedTuple):
     val_end: Optional[float]
 
 
+class ChannelBlock(NamedTuple):
+    """ Columnar meter readings for a single NMI channel
+
+    Quality methods and events are stored as small integer codes that
+    index into the ``quality_methods`` and ``events`` lookup tuples.
+    """
+
+    t_start: np.ndarray  # datetime64[s]
+    t_end: np.ndarray  # datetime64[s]
+    read_value: np.ndarray  # float64, NaN where the value was not a number
+    quality_codes: np.ndarray  # int16 index into quality_methods
+    event_codes: np.ndarray  # int16 index into events
+    quality_methods: Tuple[str, ...]
+    events: Tuple[Tuple[str, str], ...]  # (event_code, event_desc)
+    uom: str
+    meter_serial_number: str
+    # Below attributes relevant for NEM13 only
+    val_start: Optional[np.ndarray]
+    val_end: Optional[np.ndarray]
+
+
 class BasicMeterData(NamedTuple):
     """ Basic meter data record (250) """
 
@@ -123,5 +171,6 @@ class NEMFile(NamedTuple):
     """ Represents a meter reading """
 
     header: HeaderRecord
-    readings: Dict[str, Dict[str, List[Reading]]]
+    # List of Reading tuples, or a ChannelBlock when read in columnar mode
+    readings: Dict[str, Dict[str, Union[List[Reading], ChannelBlock]]]
     transactions: Dict[str, Dict[str, list]]
@@ -5,19 +5,49 @@
 """
 
 import os
+import io
 import csv
+import mmap
+import gzip
+import bz2
 import logging
 from datetime import datetime, timedelta
+from functools import lru_cache
 import zipfile
 from itertools import chain, islice
-from typing import Iterable, Any
-from typing import Optional, List, Dict
-from .nem_objects import NEMFile, HeaderRecord, NmiDetails
+from typing import Iterable, Iterator, Generator, Any, Callable
+from typing import Optional, List, Dict, Tuple
+import numpy as np
+from .nem_objects import NEMFile, HeaderRecord, NmiDetails, ChannelBlock
 from .nem_objects import Reading, BasicMeterData, IntervalRecord, EventRecord
 from .nem_objects import B2BDetails12, B2BDetails13
+from .columnar import ChannelBlockBuilder, block_from_readings, block_to_readings
+from .columnar import concat_blocks
 
 log = logging.getLogger(__name__)
 
+# Single file compression formats that can be read as a text stream
+COMPRESSED_OPENERS = {".gz": gzip.open, ".bz2": bz2.open}
+# and that can decompress an already open binary stream
+COMPRESSED_STREAMS = {
+    ".gz": lambda stream: gzip.GzipFile(fileobj=stream),
+    ".bz2": bz2.BZ2File,
+}
+
+# Given the NMI and datastream suffix of a 200 (or 250) block,
+# returns whether its readings are wanted
+ChannelFilter = Callable[[str, str], bool]
+
+
+def make_channel_filter(wanted) -> Optional[ChannelFilter]:
+    """ Build a channel filter from a predicate or from a collection of
+        "NMI-suffix" keys, such as the NEM12 mappings
+    """
+    if wanted is None or callable(wanted):
+        return wanted
+    keys = frozenset(wanted)
+    return lambda nmi, suffix: f"{nmi}-{suffix}" in keys
+
 
 def flatten_list(l: List[list]) -> list:
     """ takes a list of lists, l and returns a flat list
@@ -25,38 +55,316 @@ def flatten_list(l: List[list]) -> list:
     return [v for inner_l in l for v in inner_l]
 
 
-def read_nem_file(file_path: str, ignore_missing_header=False) -> NEMFile:
+def open_row_mmap(nem_file) -> Optional[mmap.mmap]:
+    """ Memory-map a binary NEM file if its rows can be split on commas
+
+    Returns None for empty files and files the simple split can't handle
+    (quoted fields or carriage return only line endings).
+    """
+    try:
+        mm = mmap.mmap(nem_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return None  # Empty file
+    first_line = mm.readline()
+    if mm.find(b'"') != -1 or b"\r" in first_line.rstrip(b"\r\n"):
+        mm.close()
+        return None
+    mm.seek(0)
+    return mm
+
+
+def iter_mmap_rows(
+    nem_file, channel_filter: Optional[ChannelFilter] = None
+) -> Optional[Iterator[List[str]]]:
+    """ Split the rows of a binary NEM file without the csv module
+
+    The file is memory-mapped and split into rows at the byte level, which
+    is considerably faster than csv.reader for large interval data files.
+    Returns None for files the simple split can't handle (quoted fields
+    or carriage return only line endings) so csv.reader can be used.
+
+    The 200 row of a block rejected by channel_filter is still yielded,
+    but the rest of the block is jumped over without being split.
+    """
+    mm = open_row_mmap(nem_file)
+    if mm is None:
+        return None
+
+    def skip_block():
+        # Continue from the next 200 row, or a 900 row before it
+        pos = mm.tell() - 1
+        end = mm.find(b"\n200,", pos)
+        if end == -1:
+            end = len(mm)
+        end_of_data = mm.find(b"\n900", pos, end)
+        if end_of_data != -1:
+            end = end_of_data
+        mm.seek(min(end + 1, len(mm)))
+
+    def split_rows():
+        with mm:
+            for line in iter(mm.readline, b""):
+                line = line.rstrip(b"\r\n")
+                row = line.decode("utf-8").split(",") if line else []
+                yield row
+                if (
+                    channel_filter is not None
+                    and line[:4] == b"200,"
+                    and len(row) > 4
+                    and not channel_filter(row[1], row[4])
+                ):
+                    skip_block()
+
+    return split_rows()
+
+
+def iter_stream_rows(
+    nem_text, channel_filter: Optional[ChannelFilter] = None
+) -> Iterator[List[str]]:
+    """ Split the rows of a NEM file read as a text stream
+
+    Lines without quotes are split on commas directly, others by the csv
+    module. The 200 row of a block rejected by channel_filter is still
+    yielded, but the rest of its lines are dropped without being split.
+    """
+    skipping = False
+    for line in nem_text:
+        if skipping:
+            if not (line.startswith("200,") or line.startswith("900")):
+                continue
+            skipping = False
+        if '"' in line:
+            row = next(csv.reader([line]), [])
+        else:
+            line = line.rstrip("\r\n")
+            row = line.split(",") if line else []
+        yield row
+        if (
+            channel_filter is not None
+            and row
+            and row[0] == "200"
+            and len(row) > 4
+            and not channel_filter(row[1], row[4])
+        ):
+            skipping = True
+
+
+def _iter_zip_sources(zip_file) -> Generator[Tuple[Iterator[List[str]], str], None, None]:
+    """ Yield a row iterator and name for each NEM file in a zip archive
+
+    Members whose first row isn't a 100 header row, such as a readme, are
+    skipped with a warning. Raises ValueError if no member is a NEM file.
+    """
+    log.debug("Extracting zip file")
+    found = False
+    with zipfile.ZipFile(zip_file, "r") as archive:
+        for csv_file in archive.namelist():
+            if csv_file.endswith("/") or csv_file.startswith("__MACOSX/"):
+                continue  # Directories and macOS resource forks
+            # Zip file is open in binary mode so decode as we read
+            with io.TextIOWrapper(
+                archive.open(csv_file), encoding="utf-8"
+            ) as csv_text:
+                reader = csv.reader(csv_text, delimiter=",")
+                try:
+                    first_row = next((row for row in reader if row), None)
+                except (UnicodeDecodeError, csv.Error):
+                    first_row = None
+                if first_row is None or first_row[0].strip() != "100":
+                    log.warning("Skipping %s in zip file: not a NEM file", csv_file)
+                    continue
+                found = True
+                yield chain([first_row], reader), csv_file
+    if not found:
+        raise ValueError("Zip file contains no NEM files")
+
+
+def _iter_stream_sources(
+    nem_stream, channel_filter: Optional[ChannelFilter] = None
+) -> Generator[Tuple[Iterator[List[str]], str], None, None]:
+    """ Yield a row iterator and name for the NEM file read from a binary stream
+
+    The stream (such as an S3 object body) is decoded as it is read and
+    is left open. Its name attribute, if any, is used to detect .gz,
+    .bz2 and .zip files; zip archives need a seekable stream.
+    """
+    file_name = os.path.basename(getattr(nem_stream, "name", "") or "")
+    _, file_extension = os.path.splitext(file_name)
+    file_extension = file_extension.lower()
+    if file_extension == ".zip":
+        if not nem_stream.seekable():
+            raise ValueError(f"{file_name}: zip archives can't be read as a stream")
+        yield from _iter_zip_sources(nem_stream)
+        return
+
+    if file_extension in COMPRESSED_STREAMS:
+        log.debug("Decompressing %s stream", file_extension)
+        file_name = file_name[: -len(file_extension)]
+        nem_stream = COMPRESSED_STREAMS[file_extension](nem_stream)
+
+    csv_text = io.TextIOWrapper(nem_stream, encoding="utf-8", newline="")
+    try:
+        yield iter_stream_rows(csv_text, channel_filter), file_name
+    finally:
+        csv_text.detach()
+
+
+def _iter_nem_sources(
+    file_path, channel_filter: Optional[ChannelFilter] = None
+) -> Generator[Tuple[Iterator[List[str]], str], None, None]:
+    """ Yield a row iterator and name for each NEM file held in file_path
+
+    Every member of a zip archive is yielded in turn. Zip members, .gz and
+    .bz2 files are decoded as a stream rather than inflated in full first.
+    file_path may also be an open binary stream.
+    """
+
+    if hasattr(file_path, "read"):
+        yield from _iter_stream_sources(file_path, channel_filter)
+        return
+
+    _, file_extension = os.path.splitext(file_path)
+    file_extension = file_extension.lower()
+    if file_extension == ".zip":
+        yield from _iter_zip_sources(file_path)
+        return
+
+    if file_extension in COMPRESSED_OPENERS:
+        log.debug("Decompressing %s file", file_extension)
+        file_name = os.path.basename(file_path)[: -len(file_extension)]
+        with COMPRESSED_OPENERS[file_extension](
+            file_path, "rt", encoding="utf-8"
+        ) as csv_text:
+            yield csv.reader(csv_text, delimiter=","), file_name
+        return
+
+    with open(file_path, "rb") as nmi_file:
+        rows = iter_mmap_rows(nmi_file, channel_filter=channel_filter)
+        if rows is not None:
+            yield rows, file_path
+            return
+
+    log.debug("Falling back to csv reader for %s", file_path)
+    with open(file_path) as nmi_file:
+        yield csv.reader(nmi_file, delimiter=","), file_path
+
+
+def read_nem_file(
+    file_path: str, ignore_missing_header=False, columnar=False, channel_filter=None
+) -> NEMFile:
     """ Read in NEM file and return meter readings named tuple
 
-    :param file_path: The NEM file to process
+    :param file_path: The NEM file to process, or an open binary stream of it
     :param ignore_missing_header: Whether to continue parsing if missing header.
                                   Will assume NEM12 format.
+    :param columnar: Return a ChannelBlock of arrays per channel
+                     instead of a list of Reading tuples.
+    :param channel_filter: Only read the channels accepted by this predicate
+                           of (nmi, suffix), or whose "NMI-suffix" key is in
+                           this collection. Other channels are skipped
+                           without parsing their readings.
     :returns: The file that was created
     """
 
-    _, file_extension = os.path.splitext(file_path)
-    if file_extension.lower() == ".zip":
-        log.debug("Extracting zip file")
-        with zipfile.ZipFile(file_path, "r") as archive:
-            for csv_file in archive.namelist():
-                with archive.open(csv_file) as csv_text:
-                    # Zip file is open in binary mode
-                    # So decode then convert back to list
-                    nmi_file = csv_text.read().decode("utf-8").splitlines()
-
-                    return parse_nem_file(
-                        nmi_file,
-                        file_name=csv_file,
-                        ignore_missing_header=ignore_missing_header,
-                    )
+    channel_filter = make_channel_filter(channel_filter)
+    nem_files = [
+        parse_nem_rows(
+            reader,
+            file_name=file_name,
+            ignore_missing_header=ignore_missing_header,
+            columnar=columnar,
+            channel_filter=channel_filter,
+        )
+        for reader, file_name in _iter_nem_sources(file_path, channel_filter)
+    ]
+    if not nem_files:
+        raise ValueError(f"No NEM data found in {file_path}")
+    return merge_nem_files(nem_files)
 
-    with open(file_path) as nmi_file:
-        return parse_nem_file(nmi_file, ignore_missing_header=ignore_missing_header)
 
+def merge_nem_files(nem_files: List[NEMFile]) -> NEMFile:
+    """ Merge the readings of several NEM files (e.g. the members of a zip)
 
-def parse_nem_file(nem_file, file_name="", ignore_missing_header=False) -> NEMFile:
-    """ Parse NEM file and return meter readings named tuple """
-    reader = csv.reader(nem_file, delimiter=",")
+    The header of the first file is kept.
+    """
+    if len(nem_files) == 1:
+        return nem_files[0]
+
+    readings: Dict[str, Dict[str, list]] = {}
+    trans: Dict[str, Dict[str, list]] = {}
+    for nem_file in nem_files:
+        for nmi, nmi_readings in nem_file.readings.items():
+            for channel, channel_readings in nmi_readings.items():
+                readings.setdefault(nmi, {}).setdefault(channel, []).append(
+                    channel_readings
+                )
+        for nmi, nmi_trans in nem_file.transactions.items():
+            for channel, channel_trans in nmi_trans.items():
+                trans.setdefault(nmi, {}).setdefault(channel, []).extend(
+                    channel_trans
+                )
+
+    for nmi in readings:
+        for channel in readings[nmi]:
+            parts = readings[nmi][channel]
+            if isinstance(parts[0], ChannelBlock):
+                readings[nmi][channel] = concat_blocks(parts)
+            else:
+                readings[nmi][channel] = flatten_list(parts)
+
+    return NEMFile(nem_files[0].header, readings, trans)
+
+
+def read_nem_header(file_path: str, ignore_missing_header=False) -> HeaderRecord:
+    """ Read only the header (100) row of a NEM file """
+    for reader, file_name in _iter_nem_sources(file_path):
+        header, _ = read_header(
+            reader, ignore_missing_header=ignore_missing_header, file_name=file_name
+        )
+        return header
+
+
+def iter_nem12_blocks(
+    file_path: str, ignore_missing_header=False, columnar=True, channel_filter=None
+) -> Generator[Tuple[NmiDetails, Any], None, None]:
+    """ Read a NEM12 file one NMI data details (200) block at a time
+
+    Each block is yielded as soon as the next 200 or 900 row closes it,
+    after any 400 row events have been applied, so memory use does not
+    grow with the size of the file.
+
+    :param file_path: The NEM12 file to process
+    :param ignore_missing_header: Whether to continue parsing if missing header.
+    :param columnar: Yield a ChannelBlock rather than a list of Reading tuples.
+    :param channel_filter: Only yield the channels it accepts, see read_nem_file.
+    :returns: Generator of (NmiDetails, readings) for each block
+    """
+
+    channel_filter = make_channel_filter(channel_filter)
+    for reader, file_name in _iter_nem_sources(file_path, channel_filter):
+        header, reader = read_header(
+            reader, ignore_missing_header=ignore_missing_header, file_name=file_name
+        )
+        if header.version_header != "NEM12":
+            raise ValueError(
+                "Expected a NEM12 file, got {}".format(header.version_header)
+            )
+        for nmi_details, readings, _ in parse_nem12_blocks(
+            reader,
+            file_name=file_name,
+            columnar=columnar,
+            channel_filter=channel_filter,
+        ):
+            yield nmi_details, readings
+
+
+def read_header(
+    reader: Iterator[List[str]], ignore_missing_header=False, file_name=None
+) -> Tuple[HeaderRecord, Iterator[List[str]]]:
+    """ Parse the header from a csv row iterator
+
+    :returns: The header and an iterator over the remaining rows
+    """
     first_row = next(reader, None)
 
     # Some Powercor/Citipower files have empty line at start, skip if so.
@@ -64,19 +372,61 @@ def parse_nem_file(nem_file, file_name="", ignore_missing_header=False) -> NEMFi
         first_row = next(reader, None)
 
     header = parse_header_row(
-        first_row,
-        ignore_missing_header=ignore_missing_header,
-        file_name=getattr(nem_file, "name", file_name),
+        first_row, ignore_missing_header=ignore_missing_header, file_name=file_name,
     )
 
     if header.assumed:
         # We have to parse the first row again so we don't miss any data.
         reader = chain([first_row], reader)
-        return parse_nem12_rows(reader, header=header, file_name=nem_file)
+    return header, reader
+
+
+def parse_nem_file(
+    nem_file,
+    file_name="",
+    ignore_missing_header=False,
+    columnar=False,
+    channel_filter=None,
+) -> NEMFile:
+    """ Parse NEM file and return meter readings named tuple """
+    reader = csv.reader(nem_file, delimiter=",")
+    return parse_nem_rows(
+        reader,
+        file_name=getattr(nem_file, "name", file_name),
+        ignore_missing_header=ignore_missing_header,
+        columnar=columnar,
+        channel_filter=make_channel_filter(channel_filter),
+    )
+
+
+def parse_nem_rows(
+    reader: Iterator[List[str]],
+    file_name="",
+    ignore_missing_header=False,
+    columnar=False,
+    channel_filter: Optional[ChannelFilter] = None,
+) -> NEMFile:
+    """ Parse NEM row iterator and return meter readings named tuple """
+    header, reader = read_header(
+        reader, ignore_missing_header=ignore_missing_header, file_name=file_name
+    )
+
     if header.version_header == "NEM12":
-        return parse_nem12_rows(reader, header=header, file_name=nem_file)
+        return parse_nem12_rows(
+            reader,
+            header=header,
+            file_name=file_name,
+            columnar=columnar,
+            channel_filter=channel_filter,
+        )
     else:
-        return parse_nem13_rows(reader, header=header, file_name=nem_file)
+        return parse_nem13_rows(
+            reader,
+            header=header,
+            file_name=file_name,
+            columnar=columnar,
+            channel_filter=channel_filter,
+        )
 
 
 def parse_header_row(
@@ -108,14 +458,76 @@ def parse_100_row(row: List[Any], file_name: str) -> HeaderRecord:
 
 
 def parse_nem12_rows(
-    nem_list: Iterable, header: HeaderRecord, file_name=None
+    nem_list: Iterable,
+    header: HeaderRecord,
+    file_name=None,
+    columnar=False,
+    channel_filter: Optional[ChannelFilter] = None,
 ) -> NEMFile:
     """ Parse NEM row iterator and return meter readings named tuple """
     # readings nested by NMI then channel
-    readings: Dict[str, Dict[str, List[Reading]]] = {}
+    readings: Dict[str, Dict[str, list]] = {}
     # transactions nested by NMI then channel
     trans: Dict[str, Dict[str, list]] = {}
+
+    for nmi_d, channel_readings, b2b_details in parse_nem12_blocks(
+        nem_list, file_name=file_name, columnar=columnar, channel_filter=channel_filter
+    ):
+        nmi_d_suffix_with_unit = nmi_d.nmi_suffix + "_" + nmi_d.uom
+        # The same channel may be split across more than one 200 block
+        readings.setdefault(nmi_d.nmi, {}).setdefault(
+            nmi_d_suffix_with_unit, []
+        ).append(channel_readings)
+        trans.setdefault(nmi_d.nmi, {}).setdefault(nmi_d_suffix_with_unit, []).extend(
+            b2b_details
+        )
+
+    for nmi in readings:
+        for suffix in readings[nmi]:
+            if columnar:
+                readings[nmi][suffix] = concat_blocks(readings[nmi][suffix])
+            else:
+                readings[nmi][suffix] = flatten_list(readings[nmi][suffix])
+
+    return NEMFile(header, readings, trans)
+
+
+def parse_nem12_blocks(
+    nem_list: Iterable,
+    file_name=None,
+    columnar=False,
+    partial=False,
+    channel_filter: Optional[ChannelFilter] = None,
+) -> Generator[Tuple[NmiDetails, Any, list], None, None]:
+    """ Parse NEM12 row iterator and yield each NMI data details (200) block
+
+    A block is yielded once the next 200 or 900 row (or the end of the rows)
+    closes it, as (NmiDetails, readings, B2B details).
+
+    Interval values are always collected into arrays so that 400 row events
+    can be applied as slice assignments. Reading tuples are only created,
+    once each, when a block is closed and columnar is False.
+
+    Set partial when the rows are only part of a file (e.g. a single block
+    read by byte offset) and the end of data (900) row isn't expected.
+
+    The 300, 400 and 500 rows of blocks rejected by channel_filter are
+    dropped before any of their fields are converted.
+    """
     nmi_d = None  # current NMI details block that readings apply to
+    channel_readings: Optional[ChannelBlockBuilder] = None
+    b2b_details: list = []
+    block_open = False  # rows seen since the current block was last yielded
+    skip_block = False  # current block was rejected by the channel filter
+
+    def close_block():
+        block = channel_readings.build()
+        if columnar:
+            return nmi_d, block, b2b_details
+        return nmi_d, block_to_readings(block), b2b_details
+
+    def new_readings():
+        return ChannelBlockBuilder(nmi_d.uom, nmi_d.meter_serial_number)
 
     observed_900_record = False
 
@@ -125,6 +537,9 @@ def parse_nem12_rows(
             log.debug("Skipping empty row.")
             continue
 
+        if skip_block and row[0] in ("300", "400", "500"):
+            continue
+
         record_indicator = int(row[0])
 
         if record_indicator == 900:
@@ -134,9 +549,13 @@ def parse_nem12_rows(
                 log.warning("Found multiple end of data (900) rows. ")
 
             observed_900_record = True
-            pass
+            if block_open:
+                yield close_block()
+                block_open = False
 
         elif record_indicator == 200:
+            if block_open:
+                yield close_block()
             try:
                 nmi_details = parse_200_row(row)
             except ValueError:
@@ -144,62 +563,75 @@ def parse_nem12_rows(
                 log.error(row)
                 raise
             nmi_d = nmi_details
-            nmi_d_suffix_with_unit = nmi_d.nmi_suffix + "_" + nmi_d.uom
-
-            if nmi_d.nmi not in readings:
-                readings[nmi_d.nmi] = {}
-            if nmi_d_suffix_with_unit not in readings[nmi_d.nmi]:
-                readings[nmi_d.nmi][nmi_d_suffix_with_unit] = []
-            if nmi_d.nmi not in trans:
-                trans[nmi_d.nmi] = {}
-            if nmi_d_suffix_with_unit not in trans[nmi_d.nmi]:
-                trans[nmi_d.nmi][nmi_d_suffix_with_unit] = []
-
-        elif record_indicator == 300:
-            num_intervals = int(24 * 60 / nmi_d.interval_length)
-            assert len(row) > 1, f"Invalid 300 Row in {file_name}"
-            if len(row) < num_intervals + 2:
-                record_date = row[1]
-                msg = "Skipping 300 record for %s %s %s. "
-                msg += "It does not have the expected %s intervals"
-                log.error(msg, nmi_d.nmi, nmi_d_suffix_with_unit, record_date, num_intervals)
-                continue
-            interval_record = parse_300_row(
-                row, nmi_d.interval_length, nmi_d.uom, nmi_d.meter_serial_number
+            skip_block = channel_filter is not None and not channel_filter(
+                nmi_d.nmi, nmi_d.nmi_suffix
             )
-            # don't flatten the list of interval readings at this stage,
-            # as they may need to be adjusted by a 400 row
-            readings[nmi_d.nmi][nmi_d_suffix_with_unit].append(
-                interval_record.interval_values
-            )
-
-        elif record_indicator == 400:
-            event_record = parse_400_row(row)
-            readings[nmi_d.nmi][nmi_d_suffix_with_unit][-1] = update_reading_events(
-                readings[nmi_d.nmi][nmi_d_suffix_with_unit][-1], event_record
-            )
-
-        elif record_indicator == 500:
-            b2b_details = parse_500_row(row)
-            trans[nmi_d.nmi][nmi_d_suffix_with_unit].append(b2b_details)
+            if skip_block:
+                block_open = False
+                continue
+            nmi_d_suffix_with_unit = nmi_d.nmi_suffix + "_" + nmi_d.uom
+            channel_readings = new_readings()
+            b2b_details = []
+            block_open = True
+
+        elif record_indicator in (300, 400, 500):
+            if not block_open:
+                # Rows following a 900 row continue the previous 200 block
+                channel_readings = new_readings()
+                b2b_details = []
+                block_open = True
+
+            if record_indicator == 300:
+                num_intervals = int(24 * 60 / nmi_d.interval_length)
+                assert len(row) > 1, f"Invalid 300 Row in {file_name}"
+                if len(row) < num_intervals + 2:
+                    record_date = row[1]
+                    msg = "Skipping 300 record for %s %s %s. "
+                    msg += "It does not have the expected %s intervals"
+                    log.error(
+                        msg,
+                        nmi_d.nmi,
+                        nmi_d_suffix_with_unit,
+                        record_date,
+                        num_intervals,
+                    )
+                    continue
+                interval_record = parse_300_row(
+                    row,
+                    nmi_d.interval_length,
+                    nmi_d.uom,
+                    nmi_d.meter_serial_number,
+                    columnar=True,
+                )
+                channel_readings.add_interval_record(
+                    interval_record, nmi_d.interval_length
+                )
+
+            elif record_indicator == 400:
+                # Applied to the quality and event codes of the last 300 row
+                channel_readings.apply_event(parse_400_row(row))
+
+            else:
+                b2b_details.append(parse_500_row(row))
 
         else:
             log.warning(
                 "Record indicator %s not supported and was skipped", record_indicator
             )
 
-    for nmi in readings:
-        for suffix in readings[nmi]:
-            readings[nmi][suffix] = flatten_list(readings[nmi][suffix])
+    if block_open:
+        yield close_block()
 
-    if not observed_900_record:
+    if not observed_900_record and not partial:
         log.warning("Missing end of data (900) row.")
 
-    return NEMFile(header, readings, trans)
-
 
 def parse_nem13_rows(
-    nem_list: Iterable, header: HeaderRecord, file_name=None
+    nem_list: Iterable,
+    header: HeaderRecord,
+    file_name=None,
+    columnar=False,
+    channel_filter: Optional[ChannelFilter] = None,
 ) -> NEMFile:
     """ Parse NEM row iterator and return meter readings named tuple """
     # readings nested by NMI then channel
@@ -207,14 +639,22 @@ def parse_nem13_rows(
     # transactions nested by NMI then channel
     trans: Dict[str, Dict[str, list]] = {}
     nmi_d = None  # current NMI details block that readings apply to
+    skip_block = False  # current block was rejected by the channel filter
 
     for row in nem_list:
+        if skip_block and row[0] == "550":
+            continue
+
         record_indicator = int(row[0])
 
         if record_indicator == 900:
             for nmi in readings:
                 for suffix in readings[nmi]:
                     readings[nmi][suffix] = flatten_list(readings[nmi][suffix])
+                    if columnar:
+                        readings[nmi][suffix] = block_from_readings(
+                            readings[nmi][suffix]
+                        )
             break  # End of file
 
         elif record_indicator == 550:
@@ -222,6 +662,13 @@ def parse_nem13_rows(
             trans[nmi_d.nmi][nmi_d.nmi_suffix].append(b2b_details)
 
         elif record_indicator == 250:
+            skip_block = (
+                channel_filter is not None
+                and len(row) > 4
+                and not channel_filter(row[1], row[4])
+            )
+            if skip_block:
+                continue
             basic_data = parse_250_row(row)
             reading = calculate_manual_reading(basic_data)
 
@@ -317,9 +764,13 @@ def nth(iterable, n, default=None):
 
 
 def parse_300_row(
-    row: list, interval: int, uom: str, meter_serial_number: str
+    row: list, interval: int, uom: str, meter_serial_number: str, columnar=False
 ) -> IntervalRecord:
-    """ Interval data record (300) """
+    """ Interval data record (300)
+
+    In columnar mode the interval values are returned as a float64 array
+    rather than a list of Reading tuples.
+    """
 
     num_intervals = int(24 * 60 / interval)
     interval_date = parse_datetime(row[1])
@@ -332,16 +783,19 @@ def parse_300_row(
     update_datetime = parse_datetime(nth(row, last_interval + 3, None))
     msats_load_datatime = parse_datetime(nth(row, last_interval + 4, None))
 
-    interval_values = parse_interval_records(
-        row[2:last_interval],
-        interval_date,
-        interval,
-        uom,
-        quality_method,
-        meter_serial_number,
-        reason_code,
-        reason_desc,
-    )
+    if columnar:
+        interval_values = parse_interval_values(row[2:last_interval], row[1])
+    else:
+        interval_values = parse_interval_records(
+            row[2:last_interval],
+            interval_date,
+            interval,
+            uom,
+            quality_method,
+            meter_serial_number,
+            reason_code,
+            reason_desc,
+        )
     return IntervalRecord(
         interval_date,
         interval_values,
@@ -384,6 +838,35 @@ def parse_interval_records(
     ]
 
 
+def parse_interval_values(interval_record, record_date: str = "") -> np.ndarray:
+    """ Convert interval values into a float64 array, NaN where invalid
+
+    Invalid values are reported with a single warning per record rather
+    than one per value.
+    """
+    try:
+        return np.array(interval_record, dtype=np.float64)
+    except ValueError:
+        pass
+
+    values = np.empty(len(interval_record), dtype=np.float64)
+    invalid = []
+    for i, val in enumerate(interval_record):
+        try:
+            values[i] = float(val)
+        except ValueError:
+            values[i] = np.nan
+            invalid.append(val)
+    log.warning(
+        '%s of %s readings on %s are not a number (e.g. "%s")',
+        len(invalid),
+        len(interval_record),
+        record_date,
+        invalid[0],
+    )
+    return values
+
+
 def parse_reading(val: str) -> Optional[float]:
     """ Convert reading value to float (if possible) """
     try:
@@ -432,18 +915,37 @@ def parse_550_row(row: list) -> tuple:
 
 def parse_datetime(record: str) -> Optional[datetime]:
     """ Parse a datetime string into a python datetime object """
-    # NEM defines Date8, DateTime12 and DateTime14
-    format_strings = {8: "%Y%m%d", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}
-
     if record == "" or record is None:
         return None
+    return _parse_nem_datetime(record)
+
 
+@lru_cache(maxsize=4096)
+def _parse_nem_datetime(record: str) -> Optional[datetime]:
+    """ Parse a fixed width NEM Date8, DateTime12 or DateTime14 string
+
+    The digits are sliced directly rather than going through strptime.
+    The same dates repeat on every channel of every NMI in a file, so
+    recent results are cached.
+    """
+    # NEM defines Date8, DateTime12 and DateTime14
+    format_strings = {8: "%Y%m%d", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}
+
+    value = record.strip()
     try:
-        timestamp = datetime.strptime(
-            record.strip(), format_strings[len(record.strip())]
+        if not (value.isascii() and value.isdigit()):
+            # Leave anything unusual to strptime
+            return datetime.strptime(value, format_strings[len(value)])
+        if len(value) not in format_strings:
+            raise KeyError(len(value))
+        return datetime(
+            int(value[0:4]),
+            int(value[4:6]),
+            int(value[6:8]),
+            int(value[8:10] or 0),
+            int(value[10:12] or 0),
+            int(value[12:14] or 0),
         )
     except (ValueError, KeyError):
         log.debug(f"Malformed date '{record}' ")
         return None
-
-    return timestamp
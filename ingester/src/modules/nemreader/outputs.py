@@ -4,84 +4,234 @@
     Output results in different formats
 """
 
+from __future__ import annotations
+
 import os
 import logging
 import csv
-from typing import Generator, Tuple, List, Dict, Any
+from typing import Generator, Tuple, List, Dict, Any, Iterable, Union, Optional
 from pathlib import Path
-import pandas as pd
-from .nem_objects import Reading
-from .nem_reader import read_nem_file
-from .split_days import split_multiday_reads
-from modules.common import CloudWatchLogger
+from datetime import datetime
+from functools import reduce
+import numpy as np
+from .nem_objects import NEMFile, Reading, ChannelBlock
+from .nem_reader import read_nem_file, read_header, make_channel_filter
+from .nem_reader import parse_nem12_blocks, parse_nem13_rows, _iter_nem_sources
+from .lazy_reader import read_nem_file_lazy
+from .columnar import block_columns, block_from_readings
+from .split_days import split_multiday_block
+from modules.common import CloudWatchLogger, lazy_import
 
 log = logging.getLogger(__name__)
 
+pd = lazy_import("pandas")
+
 parse_error_log = CloudWatchLogger("sbm-ingester-parse-error-log")
 
 
 def nmis_in_file(file_name) -> Generator[Tuple[str, List[str]], None, None]:
     """Return list of NMIs in file"""
-    m = read_nem_file(file_name)
+    # Only the 200 rows are read, the channels are never accessed
+    m = read_nem_file_lazy(file_name)
     for nmi in m.transactions.keys():
         suffixes = list(m.transactions[nmi].keys())
         yield nmi, suffixes
 
 
+def channels_in_file(file_name, ignore_missing_header=False) -> List[Tuple[str, str]]:
+    """Return the (NMI, datastream suffix) of each channel in file
+
+    Only the 200 (or 250) rows are read, all interval data is skipped.
+    """
+    channels: Dict[Tuple[str, str], None] = {}
+
+    def record_channel(nmi: str, suffix: str) -> bool:
+        channels[(nmi, suffix)] = None
+        return False
+
+    read_nem_file(
+        file_name,
+        ignore_missing_header=ignore_missing_header,
+        channel_filter=record_channel,
+    )
+    return list(channels)
+
+
+ALIGN_OPTIONS = ("first", "outer", "inner")
+
+
+def _channel_positions(t_start: np.ndarray, index: np.ndarray) -> Optional[np.ndarray]:
+    """Position of each index timestamp in a channel, -1 where missing.
+
+    Returns None when the channel already has exactly the index timestamps.
+    """
+    if np.array_equal(t_start, index):
+        return None
+    # Raises for channels with duplicate timestamps, as reindexing did
+    return pd.Index(t_start).get_indexer(index)
+
+
+def _take(values: np.ndarray, positions: Optional[np.ndarray]) -> np.ndarray:
+    """Take values at positions, NaN (or NaT) where the position is -1"""
+    if positions is None:
+        return values
+    taken = values[positions]
+    taken[positions < 0] = np.datetime64("NaT") if values.dtype.kind == "M" else np.nan
+    return taken
+
+
 def get_data_frame(
     nmi_transactions: Dict[str, list],
-    nmi_readings: Dict[str, List[Reading]],
+    nmi_readings: Dict[str, Union[List[Reading], ChannelBlock]],
     split_days: bool = False,
+    align: str = "first",
 ) -> pd.DataFrame:
-    """Get a Pandas DataFrame for Point(s)"""
+    """Get a Pandas DataFrame for Point(s)
+
+    :param align: How channels with different timestamps are lined up.
+                  "first" uses the timestamps of the first channel, "outer"
+                  every timestamp in any channel and "inner" only those in
+                  all channels. Missing values are NaN.
+    """
+
+    if align not in ALIGN_OPTIONS:
+        raise ValueError(f"align must be one of {ALIGN_OPTIONS}, not {align}")
 
     channels = list(nmi_transactions.keys())
-    if split_days:
-        # Split any readings that are >24 hours
-        for ch in channels:
-            nmi_readings[ch] = list(split_multiday_reads(nmi_readings[ch]))
-
-    first_ch = channels[0]
-    d = {
-        "t_start": [x.t_start for x in nmi_readings[first_ch]],
-        "t_end": [x.t_end for x in nmi_readings[first_ch]],
-        "quality_method": [x.quality_method for x in nmi_readings[first_ch]],
-        "event_code": [x.event_code for x in nmi_readings[first_ch]],
-        "event_desc": [x.event_desc for x in nmi_readings[first_ch]],
-    }
-    d[first_ch] = [x.read_value for x in nmi_readings[first_ch]]
-
-    df = pd.DataFrame(data=d, index=d["t_start"])
-    for ch in channels[1:]:
-        index = [x.t_start for x in nmi_readings[ch]]
-        values = [x.read_value for x in nmi_readings[ch]]
-        ser = pd.Series(data=values, index=index, name=ch)
-     
-        df.loc[:, ch] = ser
-    return df
+    blocks = {}
+    for ch in channels:
+        block = nmi_readings[ch]
+        if not isinstance(block, ChannelBlock):
+            block = block_from_readings(block)
+        if split_days:
+            # Split any readings that are >24 hours
+            block = split_multiday_block(block)
+        blocks[ch] = block
+
+    first = blocks[channels[0]]
+    if align == "first" or len(channels) == 1:
+        index = first.t_start
+    elif align == "outer":
+        index = reduce(np.union1d, (b.t_start for b in blocks.values()))
+    else:
+        index = reduce(np.intersect1d, (b.t_start for b in blocks.values()))
+
+    # Interval details come from the first channel
+    first_columns = block_columns(first)
+    first_positions = _channel_positions(first.t_start, index)
+    d = {"t_start": index.astype("datetime64[ns]")}
+    for column in ("t_end", "quality_method", "event_code", "event_desc"):
+        d[column] = _take(first_columns[column], first_positions)
+
+    # Each channel's values are aligned to the shared index in one take,
+    # and the frame is built from all columns at once.
+    for ch in channels:
+        block = blocks[ch]
+        positions = (
+            first_positions
+            if block is first
+            else _channel_positions(block.t_start, index)
+        )
+        d[ch] = _take(block.read_value, positions)
+
+    return pd.DataFrame(data=d, index=d["t_start"])
 
 
 def output_as_data_frames(
-    file_name, split_days: bool = True, ignore_missing_header: bool = False
+    file_name,
+    split_days: bool = True,
+    ignore_missing_header: bool = False,
+    align: str = "first",
+    channel_filter=None,
 ) -> List[pd.DataFrame]:
-    """Return list of data frames for each NMI"""
+    """Return list of data frames for each NMI
+
+    :param align: How channels are lined up, see get_data_frame.
+    :param channel_filter: Only include the channels it accepts, see read_nem_file.
+                           NMIs with no accepted channels are left out.
+    """
 
-    m = read_nem_file(file_name, ignore_missing_header=ignore_missing_header)
-    nmis = list(m.readings.keys())
+    m = read_nem_file(
+        file_name,
+        ignore_missing_header=ignore_missing_header,
+        columnar=True,
+        channel_filter=channel_filter,
+    )
+    return _nem_file_data_frames(m, file_name, split_days, align)
+
+
+def _nem_file_data_frames(
+    m: NEMFile, file_name, split_days: bool = True, align: str = "first"
+) -> List[pd.DataFrame]:
+    """Build the data frame of each NMI in a file that has been read"""
     data_frames = []
     timestampNow = pd.Timestamp.now().isoformat()
-    for nmi in nmis:
-        try: 
-            nmi_readings = m.readings[nmi]
-            nmi_df = get_data_frame(m.transactions[nmi], nmi_readings, split_days)
-            data_frames.append((nmi, nmi_df))
-        except:
+    for nmi in m.readings.keys():
+        try:
+            nmi_df = get_data_frame(
+                m.transactions[nmi], m.readings[nmi], split_days, align=align
+            )
+        except Exception:
             parse_error_log.log(
                 f"Error processing NMI {nmi} in file {file_name} at {timestampNow}"
             )
+            continue
+        data_frames.append((nmi, nmi_df))
     return data_frames
 
 
+def iter_data_frames(
+    file_name,
+    split_days: bool = True,
+    ignore_missing_header: bool = False,
+    channel_filter=None,
+) -> Generator[Tuple[str, pd.DataFrame], None, None]:
+    """Yield a data frame for each NMI data block as the file is read
+
+    NEM12 files are streamed one 200 block (a single channel) at a time so
+    only one block is held in memory. NEM13 files are yielded per NMI.
+    file_name may be a path or an open binary stream.
+
+    :param channel_filter: Only include the channels it accepts, see read_nem_file.
+    """
+
+    # Each file (or zip member) is read in a single pass, so file_name can
+    # also be a stream that can't be rewound, such as an S3 object body.
+    channel_filter = make_channel_filter(channel_filter)
+    timestampNow = pd.Timestamp.now().isoformat()
+    for reader, source_name in _iter_nem_sources(file_name, channel_filter):
+        header, reader = read_header(
+            reader, ignore_missing_header=ignore_missing_header, file_name=source_name
+        )
+        if header.version_header != "NEM12":
+            m = parse_nem13_rows(
+                reader,
+                header=header,
+                file_name=source_name,
+                columnar=True,
+                channel_filter=channel_filter,
+            )
+            yield from _nem_file_data_frames(m, source_name, split_days)
+            continue
+
+        for nmi_details, block, _ in parse_nem12_blocks(
+            reader,
+            file_name=source_name,
+            columnar=True,
+            channel_filter=channel_filter,
+        ):
+            nmi = nmi_details.nmi
+            channel = nmi_details.nmi_suffix + "_" + nmi_details.uom
+            try:
+                nmi_df = get_data_frame({channel: []}, {channel: block}, split_days)
+            except:
+                parse_error_log.log(
+                    f"Error processing NMI {nmi} in file {source_name} at {timestampNow}"
+                )
+                continue
+            yield nmi, nmi_df
+
+
 def output_as_csv(file_name, output_dir="."):
     """
     Transpose all channels and output a csv that is easier
@@ -95,7 +245,7 @@ def output_as_csv(file_name, output_dir="."):
     output_dir = Path(output_dir)
     output_paths = []
     os.makedirs(output_dir, exist_ok=True)
-    m = read_nem_file(file_name)
+    m = read_nem_file(file_name, columnar=True)
     nmis = m.readings.keys()
     for nmi in nmis:
         df = get_data_frame(m.transactions[nmi], m.readings[nmi])
@@ -107,7 +257,7 @@ def output_as_csv(file_name, output_dir="."):
     return output_paths
 
 
-def save_to_csv(headings: List[str], rows: List[list], output_path):
+def save_to_csv(headings: List[str], rows: Iterable[list], output_path):
     """save data to csv file"""
     with open(output_path, "w", newline="") as csvfile:
         cwriter = csv.writer(
@@ -120,56 +270,119 @@ def save_to_csv(headings: List[str], rows: List[list], output_path):
     return output_path
 
 
-def flatten_and_group_rows(
+# strftime directives that need more than the date of a reading
+TIME_DIRECTIVES = ("%H", "%I", "%M", "%S", "%p", "%f", "%X", "%c", "%T", "%R", "%r")
+
+
+def _group_periods(
+    t_start: np.ndarray, date_format: str
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Group reading start times by their date_format label.
+
+    Each distinct day (or timestamp, if the format includes a time) is
+    formatted once. Groups are numbered in order of first appearance.
+
+    :returns: The group labels, the group of each reading and the
+        position of the first reading in each group
+    """
+    if any(directive in date_format for directive in TIME_DIRECTIVES):
+        periods = t_start
+    else:
+        periods = t_start.astype("datetime64[D]")
+    uniques, first_seen, inverse = np.unique(
+        periods, return_index=True, return_inverse=True
+    )
+    labels = [p.strftime(date_format) for p in uniques.astype(datetime).tolist()]
+
+    group_ids: Dict[str, int] = {}
+    group_firsts = []
+    period_groups = np.empty(len(uniques), dtype=np.intp)
+    for period in np.argsort(first_seen, kind="stable"):
+        label = labels[period]
+        if label not in group_ids:
+            group_ids[label] = len(group_ids)
+            group_firsts.append(first_seen[period])
+        period_groups[period] = group_ids[label]
+    return (
+        list(group_ids),
+        period_groups[inverse.ravel()],
+        np.array(group_firsts, dtype=np.intp),
+    )
+
+
+def iter_grouped_rows(
     nmi: str,
     nmi_transactions: Dict[str, list],
-    nmi_readings: Dict[str, List[Reading]],
+    nmi_readings: Dict[str, Union[List[Reading], ChannelBlock]],
     date_format: str = "%Y%m%d",
-) -> List[list]:
-    """Create flattened list of NMI reading data"""
+) -> Generator[list, None, None]:
+    """Yield flattened NMI reading totals, one row per channel and period
+
+    The total of a period with any missing (NaN) interval value is left
+    blank rather than summed from the intervals that are present, the way
+    missing values are written in the interval CSV, and the period is
+    logged as incomplete.
+    """
 
     channels = list(nmi_transactions.keys())
 
     # Datastream suffix starting with a number are Accumulated Metering Data (NEM13)
     # Ensure no reading exceeds 24 hours
-    split_required = False
-    for ch in channels:
-        if ch[0].isdigit():
-            split_required = True
-    if split_required:
-        nmi_readings = split_multiday_reads(nmi_readings)
+    split_required = any(ch[0].isdigit() for ch in channels)
 
-    rows = []
     for ch in channels:
-        date_totals = {}
-        date_qualities = {}
-        uom = ""
-        sn = ""
-        for read in nmi_readings[ch]:
-            t_end = read.t_start
-            val = read.read_value
-            uom = read.uom  # Only last value will be saved
-            sn = read.meter_serial_number
-            quality = read.quality_method
-            t_group = t_end.strftime(date_format)
-            try:
-                date_totals[t_group] += val
-            except KeyError:
-                date_totals[t_group] = val
+        block = nmi_readings[ch]
+        if not isinstance(block, ChannelBlock):
+            block = block_from_readings(block)
+        if split_required:
+            block = split_multiday_block(block)
+        if not len(block.t_start):
+            continue
+
+        labels, groups, firsts = _group_periods(block.t_start, date_format)
+        num_groups = len(labels)
+        totals = np.bincount(groups, weights=block.read_value, minlength=num_groups)
+        incomplete = np.isnan(totals)
+        if incomplete.any():
+            log.warning(
+                "%s %s has missing values, totals left blank for %s",
+                nmi,
+                ch,
+                ", ".join(label for label, bad in zip(labels, incomplete) if bad),
+            )
 
-            if t_group not in date_qualities.keys():
-                date_qualities[t_group] = set()
-            date_qualities[t_group].add(quality)
+        # Count the distinct quality methods in each group
+        num_codes = max(len(block.quality_methods), 1)
+        group_codes = np.unique(groups * num_codes + block.quality_codes)
+        num_qualities = np.bincount(group_codes // num_codes, minlength=num_groups)
+        first_codes = block.quality_codes[firsts]
+
+        for group, (label, total) in enumerate(zip(labels, totals.tolist())):
+            if incomplete[group]:
+                total = None  # Written as an empty field
+            quality = block.quality_methods[first_codes[group]]
+            if num_qualities[group] > 1 or len(quality) > 1:
+                quality = "V"  # Multiple quality methods
+            row: List[Any] = [
+                nmi,
+                block.meter_serial_number,
+                label,
+                ch,
+                total,
+                block.uom,
+                quality,
+            ]
+            yield row
 
-        for day in date_totals.keys():
-            day_total = date_totals[day]
-            qualities = list(date_qualities[day])
-            day_quality = "".join(qualities)
-            if len(day_quality) > 1:
-                day_quality = "V"  # Multiple quality methods
-            row: List[Any] = [nmi, sn, day, ch, day_total, uom, day_quality]
-            rows.append(row)
-    return rows
+
+def flatten_and_group_rows(
+    nmi: str,
+    nmi_transactions: Dict[str, list],
+    nmi_readings: Dict[str, Union[List[Reading], ChannelBlock]],
+    date_format: str = "%Y%m%d",
+) -> List[list]:
+    """Create flattened list of NMI reading data"""
+    return list(iter_grouped_rows(nmi, nmi_transactions, nmi_readings, date_format))
 
 
 def output_as_daily_csv(file_name, output_dir="."):
@@ -177,6 +390,9 @@ def output_as_daily_csv(file_name, output_dir="."):
     Transpose all channels and output a daily csv that is easier
     to read and do charting on
 
+    A day with any missing interval value has an empty day_total, see
+    iter_grouped_rows.
+
     :param file_name: The NEM file to process
     :param output_dir: Specify different output location
     :returns: The file that was created
@@ -189,9 +405,7 @@ def output_as_daily_csv(file_name, output_dir="."):
     output_file = "{}_daily_totals.csv".format(file_stem)
     output_path = output_dir / output_file
 
-    m = read_nem_file(file_name)
-    nmis = m.readings.keys()
-    all_rows = []
+    m = read_nem_file(file_name, columnar=True)
     headings = [
         "nmi",
         "meter_sn",
@@ -201,11 +415,12 @@ def output_as_daily_csv(file_name, output_dir="."):
         "uom",
         "quality_method",
     ]
-    for nmi in nmis:
-        rows = flatten_and_group_rows(nmi, m.transactions[nmi], m.readings[nmi])
-        for row in rows:
-            all_rows.append(row)
-
-    save_to_csv(headings, all_rows, output_path)
+    # Rows are written as they are grouped rather than collected first
+    rows = (
+        row
+        for nmi in m.readings.keys()
+        for row in iter_grouped_rows(nmi, m.transactions[nmi], m.readings[nmi])
+    )
+    save_to_csv(headings, rows, output_path)
 
     return output_path
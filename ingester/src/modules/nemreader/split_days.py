@@ -1,6 +1,81 @@
-from typing import Iterable, Generator
+from typing import Iterable, Generator, Tuple
 from datetime import timedelta
-from .nem_objects import Reading
+import numpy as np
+from .nem_objects import Reading, ChannelBlock
+
+
+DAY = np.timedelta64(1, "D")
+
+
+def split_days_arrays(
+    t_start: np.ndarray, t_end: np.ndarray, values: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Split reads longer than 24 hours into pro-rated daily reads
+
+    Vectorised equivalent of split_multiday_reads for datetime64[s] arrays.
+
+    :returns: The start, end and value of each daily read, and the index of
+              the read it came from (to carry across any other fields)
+    """
+    t_start = t_start.astype("datetime64[s]")
+    t_end = t_end.astype("datetime64[s]")
+    total_secs = (t_end - t_start).astype(np.int64)
+    split = total_secs > 24 * 60 * 60
+
+    # The first piece runs to midnight, then a piece per (partial) day
+    next_day = (t_start.astype("datetime64[D]") + DAY).astype("datetime64[s]")
+    remaining_secs = np.where(split, t_end - next_day, 0).astype(np.int64)
+    num_pieces = np.where(split, 1 - (-remaining_secs // (24 * 60 * 60)), 1)
+
+    source = np.repeat(np.arange(len(t_start)), num_pieces)
+    # Piece number within each read
+    piece = np.arange(len(source)) - np.repeat(
+        np.cumsum(num_pieces) - num_pieces, num_pieces
+    )
+    is_split = split[source]
+
+    starts = np.where(
+        piece == 0, t_start[source], next_day[source] + (piece - 1) * DAY
+    )
+    ends = np.where(
+        is_split,
+        np.minimum(next_day[source] + piece * DAY, t_end[source]),
+        t_end[source],
+    )
+    split_values = values[source].copy()
+    piece_secs = (ends - starts).astype(np.int64)
+    split_values[is_split] = values[source][is_split] * (
+        piece_secs[is_split] / total_secs[source][is_split]
+    )
+    return starts, ends, split_values, source
+
+
+def split_multiday_block(block: ChannelBlock) -> ChannelBlock:
+    """ Split a block's readings into daily intervals if they exceed 24 hours """
+    if not len(block.t_start):
+        return block
+    if (block.t_end - block.t_start).max() <= np.timedelta64(1, "D"):
+        # Don't need to do anything
+        return block
+
+    starts, ends, values, source = split_days_arrays(
+        block.t_start, block.t_end, block.read_value
+    )
+    val_start = val_end = None
+    if block.val_start is not None:
+        # Register reads no longer apply to the pieces of a split read
+        unsplit = np.bincount(source)[source] == 1
+        val_start = np.where(unsplit, block.val_start[source], np.nan)
+        val_end = np.where(unsplit, block.val_end[source], np.nan)
+    return block._replace(
+        t_start=starts,
+        t_end=ends,
+        read_value=values,
+        quality_codes=block.quality_codes[source],
+        event_codes=block.event_codes[source],
+        val_start=val_start,
+        val_end=val_end,
+    )
 
 
 def split_multiday_reads(
@@ -1,9 +1,8 @@
-import pandas as pd
-import numpy as np
-import boto3
 import traceback
-from modules.common import CloudWatchLogger
+from modules.common import CloudWatchLogger, lazy_import
+from modules.s3Uploader import get_shared_uploader
 
+pd = lazy_import("pandas")
 
 parse_error_log = CloudWatchLogger("sbm-ingester-parse-error-log")
 
@@ -82,14 +81,13 @@ def optimaUsageAndSpendToS3(fileName, errorFilePath):
         raise Exception("Not Valid Optima Usage And Spend File")
 
     # boto3 will use IAM role or env vars — no hardcoding creds
-    s3 = boto3.client("s3")
     S3_BUCKET = "gegoptimareports"
     S3_KEY = "usageAndSpendReports/racvUsageAndSpend.csv"
 
     with open(fileName, "rb") as file:
         file_data = file.read()
 
-    s3.put_object(Bucket=S3_BUCKET, Key=S3_KEY, Body=file_data)
+    get_shared_uploader().call("put_object", Bucket=S3_BUCKET, Key=S3_KEY, Body=file_data)
     return []
 
 
@@ -167,6 +165,58 @@ def greenSquarePrivateWireSchneiderComXParser(fileName, errorFilePath):
     return [(f"GPWComX_{siteName}", bufDF)]
 
 
+# ---------------------- Pre-scan ---------------------- #
+
+def nonNemMonitorPointNames(fileName):
+    """Monitor point names the parsers could produce for a file.
+
+    Only the identifier columns (or header rows) of each known format are
+    read. Returns None when the file isn't a recognised format, or may have
+    side effects (Optima usage and spend), so it has to be parsed in full.
+    """
+    if "RACV-Usage and Spend Report" in fileName:
+        return None
+
+    names = set()
+    recognised = False
+
+    # Envizi water, water bulk and electricity
+    try:
+        serials = pd.read_csv(fileName, usecols=['Serial_No'])['Serial_No'].astype(str)
+        names.update(f"Envizi_{name}-E1" for name in serials.unique())
+        recognised = True
+    except Exception:
+        pass
+
+    # Optima generation
+    try:
+        identifiers = pd.read_csv(fileName, usecols=['Identifier'])['Identifier'].astype(str)
+        names.update(f"Optima_{name}-B1" for name in identifiers.unique())
+        recognised = True
+    except Exception:
+        pass
+
+    # RACV electricity
+    try:
+        columns = pd.read_csv(fileName, skiprows=[0, 1], nrows=0).columns
+        if "Date" in columns and "Start Time" in columns:
+            names.update(f"Optima_{x.split(' ')[0]}-E1" for x in columns if "kWh" in x)
+            recognised = True
+    except Exception:
+        pass
+
+    # Green Square private wire Schneider ComX
+    try:
+        first_rows = pd.read_csv(fileName, header=None, nrows=2)
+        if first_rows.iloc[1, 0] == "ComX510_Green_Square":
+            names.add(f"GPWComX_{first_rows.iloc[1, 4].replace(' ', '')}-E1")
+            recognised = True
+    except Exception:
+        pass
+
+    return names if recognised else None
+
+
 # ---------------------- Dispatcher ---------------------- #
 
 def nonNemParsersGetDf(fileName, errorFilePath):
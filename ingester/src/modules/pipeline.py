@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StageStats:
+    """Busy time and queue depth of one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def add_busy(self, seconds: float):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += seconds
+
+    def sample_queue_depth(self, depth: int):
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+            self._depth_total += depth
+            self._depth_samples += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            mean_depth = self._depth_total / self._depth_samples if self._depth_samples else 0
+            return {
+                self.name + "Items": self.items,
+                self.name + "BusySeconds": round(self.busy_seconds, 3),
+                self.name + "QueueMaxDepth": self.max_queue_depth,
+                self.name + "QueueMeanDepth": round(mean_depth, 2),
+            }
+
+
+def prefetch(items, func, depth: int, stats: StageStats):
+    """Yield (item, func(item)) in order, computed on a background thread.
+
+    At most depth results are kept waiting, so the producer blocks once it
+    is that far ahead of the consumer. The queue depth is sampled each time
+    the consumer takes a result; a mean near zero means the consumer is
+    waiting on func. An exception from func is raised in the consumer.
+    """
+    results = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                results.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                start = time.perf_counter()
+                result = func(item)
+                stats.add_busy(time.perf_counter() - start)
+                if not put((item, result)):
+                    return
+            put(_DONE)
+        except Exception as e:
+            # Raised again in the consumer
+            put(e)
+
+    thread = threading.Thread(target=produce, name=stats.name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            stats.sample_queue_depth(results.qsize())
+            entry = results.get()
+            if entry is _DONE:
+                return
+            if isinstance(entry, Exception):
+                raise entry
+            yield entry
+    finally:
+        stop.set()
+        thread.join()
@@ -0,0 +1,86 @@
+import io
+import os
+import shutil
+
+# Bytes kept from the start of an object so it can be read again
+PEEK_SIZE = 1024 * 1024
+
+
+class S3ObjectStream:
+    """Read an S3 object as a stream that can be restarted from the beginning.
+
+    The first peek_size bytes are kept as they are read, so open() can
+    start again from the beginning without another GET, e.g. after the NEM
+    reader rejects the header. Once more than that has been read, open()
+    fetches the object again.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, peek_size: int = PEEK_SIZE):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.name = os.path.basename(key)
+        self.peek_size = peek_size
+        self.gets = 0
+        self._body = None
+        self._peek = bytearray()
+        self._recording = True
+
+    def start(self):
+        """GET the object, if it hasn't been fetched since the last restart."""
+        if self._body is None or not self._recording:
+            self.close()
+            self._body = self.s3_client.get_object(Bucket=self.bucket, Key=self.key)["Body"]
+            self._peek = bytearray()
+            self._recording = True
+            self.gets += 1
+
+    def open(self) -> io.BufferedReader:
+        """A binary stream of the object from the start.
+
+        Streams opened before are no longer valid.
+        """
+        self.start()
+        return io.BufferedReader(_ReplayReader(self))
+
+    def save(self, path: str):
+        """Write the whole object to path, for readers that need random access."""
+        with self.open() as source, open(path, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+
+    def close(self):
+        if self._body is not None:
+            self._body.close()
+            self._body = None
+
+    def _read_body(self, size: int) -> bytes:
+        data = self._body.read(size)
+        if self._recording:
+            if len(self._peek) + len(data) <= self.peek_size:
+                self._peek += data
+            else:
+                self._recording = False
+                self._peek = bytearray()
+        return data
+
+
+class _ReplayReader(io.RawIOBase):
+    """Raw reader that replays the kept start of an object, then reads on."""
+
+    def __init__(self, stream: S3ObjectStream):
+        self.stream = stream
+        self.name = stream.name
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        peek = self.stream._peek
+        if self._pos < len(peek):
+            data = peek[self._pos : self._pos + len(b)]
+        else:
+            data = self.stream._read_body(len(b))
+        b[: len(data)] = data
+        self._pos += len(data)
+        return len(data)
@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from modules.awsClients import get_client
+from modules.pipeline import StageStats
+from botocore.exceptions import (
+    BotoCoreError,
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+# Error codes S3 (and other AWS services) use to ask callers to slow down
+THROTTLE_ERROR_CODES = {
+    "SlowDown",
+    "503",
+    "ServiceUnavailable",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+}
+RETRYABLE_ERROR_CODES = {"InternalError", "RequestTimeout", "500"}
+RETRYABLE_CONNECTION_ERRORS = (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+
+def _error_code(e: ClientError) -> str:
+    return str(e.response.get("Error", {}).get("Code", ""))
+
+
+def _status_code(e: ClientError) -> int:
+    return e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+
+
+def is_throttle_error(e: Exception) -> bool:
+    """Whether S3 rejected the request to slow the caller down."""
+    if not isinstance(e, ClientError):
+        return False
+    return _error_code(e) in THROTTLE_ERROR_CODES or _status_code(e) == 503
+
+
+def is_retryable_error(e: Exception) -> bool:
+    """Whether the request may succeed if it is sent again."""
+    if is_throttle_error(e) or isinstance(e, RETRYABLE_CONNECTION_ERRORS):
+        return True
+    if isinstance(e, ClientError):
+        return _error_code(e) in RETRYABLE_ERROR_CODES or _status_code(e) >= 500
+    return False
+
+
+class AdaptiveLimit:
+    """AIMD concurrency limit.
+
+    The limit grows by one after a full window (limit) of successful
+    requests and is halved whenever a request is throttled.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit:
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+class S3Uploader:
+    """Send S3 requests from a bounded thread pool with adaptive concurrency.
+
+    submit() queues a client operation and returns a Future. It blocks
+    while max_pending requests are outstanding, so callers can't buffer
+    unbounded request bodies. call() runs an operation in the calling
+    thread under the same limit and retries.
+
+    Throttled (SlowDown/503) requests halve the concurrency limit, and
+    retryable failures are sent again after a full-jitter exponential
+    backoff, up to max_attempts in total.
+
+    stage_stats records the time spent in requests and the number of
+    queued or running requests at each submit().
+    """
+
+    def __init__(
+        self,
+        client=None,
+        max_concurrency: int = 32,
+        initial_concurrency: int = 8,
+        max_pending: int = 64,
+        max_attempts: int = 6,
+        base_delay: float = 0.1,
+        max_delay: float = 5.0,
+    ):
+        if client is None:
+            # Retries are done here so that throttling adjusts the limit
+            client = get_client("s3", retries={"mode": "standard", "total_max_attempts": 1})
+        self.client = client
+        self.limit = AdaptiveLimit(initial_concurrency, 1, max_concurrency)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0}
+        self.stage_stats = StageStats("upload")
+        self._stats_lock = threading.Lock()
+        self._outstanding = 0
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="s3-uploader"
+        )
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def call(self, operation: str, **kwargs):
+        """Run a client operation, e.g. call("copy_object", ...), with retries.
+
+        File object arguments (Fileobj, or a file Body) are rewound to where
+        they started before each attempt, as a failed attempt may have read
+        them part or all of the way.
+        """
+        method = getattr(self.client, operation)
+        rewind = [
+            (kwargs[name], kwargs[name].tell())
+            for name in ("Fileobj", "Body")
+            if hasattr(kwargs.get(name), "seek")
+        ]
+        for attempt in range(1, self.max_attempts + 1):
+            for fileobj, position in rewind:
+                fileobj.seek(position)
+            self.limit.acquire()
+            throttled = False
+            start = time.perf_counter()
+            try:
+                self._count("requests")
+                return method(**kwargs)
+            except (ClientError, BotoCoreError) as e:
+                throttled = is_throttle_error(e)
+                if throttled:
+                    self._count("throttled")
+                if attempt == self.max_attempts or not is_retryable_error(e):
+                    raise
+            finally:
+                self.limit.release(throttled)
+                self.stage_stats.add_busy(time.perf_counter() - start)
+            self._count("retries")
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def submit(self, operation: str, **kwargs) -> Future:
+        """Queue a client operation on the pool."""
+        self._pending.acquire()
+        with self._stats_lock:
+            self._outstanding += 1
+            self.stage_stats.sample_queue_depth(self._outstanding)
+        try:
+            future = self._executor.submit(self.call, operation, **kwargs)
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(lambda f: self._done())
+        return future
+
+    def _done(self):
+        with self._stats_lock:
+            self._outstanding -= 1
+        self._pending.release()
+
+    def put_object(self, **kwargs) -> Future:
+        return self.submit("put_object", **kwargs)
+
+    def upload_fileobj(self, **kwargs) -> Future:
+        """Managed (multipart) upload of a file object."""
+        return self.submit("upload_fileobj", **kwargs)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def wait_for_uploads(futures):
+    """Wait for every upload and raise the first error, if any."""
+    error = None
+    for future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
+
+
+_shared_uploader = None
+_shared_uploader_lock = threading.Lock()
+
+
+def get_shared_uploader() -> S3Uploader:
+    """The uploader (and its pooled S3 client) shared within a container."""
+    global _shared_uploader
+    with _shared_uploader_lock:
+        if _shared_uploader is None:
+            _shared_uploader = S3Uploader()
+        return _shared_uploader
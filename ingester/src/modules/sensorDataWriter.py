@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import io
+import random
+import tempfile
+import numpy as np
+from boto3.s3.transfer import TransferConfig
+from modules.common import lazy_import
+from modules.s3Uploader import wait_for_uploads
+from modules.sensorDataCsv import SensorDataCsvEncoder
+
+pd = lazy_import("pandas")
+
+SENSOR_DATA_BUCKET = "hudibucketsrc"
+SENSOR_DATA_PREFIX = "sensorDataFiles/"
+SENSOR_DATA_COLUMNS = ["sensorId", "ts", "val", "unit", "its"]
+
+# Objects above this size are sent as a multipart upload
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+
+def sensorDataObjectKey(name: str, compressed: bool = False) -> str:
+    """Unique sensorDataFiles/ key for an object named after a monitor point, file or batch."""
+    return (
+        SENSOR_DATA_PREFIX
+        + name
+        + pd.Timestamp.now().strftime('%Y_%b_%dT%H_%M_%S_%f')
+        + str(random.randint(1, 1000000))
+        + (".csv.gz" if compressed else ".csv")
+    )
+
+
+def sensorDataLongFormat(nmi: str, wideDf: pd.DataFrame, mappings: dict, suffixes: set):
+    """Reshape one NMI's wide frame into sensorId,ts,val,unit,its rows in one step.
+
+    Columns named <suffix>_<unit>, with a suffix in suffixes, are data
+    streams. Returns (channels, df): channels has a (monitorPointName,
+    sensorId, unit) tuple per data stream column in column order, with
+    sensorId None when the monitor point isn't in mappings. df has the rows
+    of the mapped channels (None if there are none), len(wideDf) rows per
+    channel in the same order. ts and its are left as datetimes for
+    SensorDataCsvEncoder to format, which formats them once for both.
+    """
+    channels = []
+    mapped = []
+    for col in wideDf.columns:
+        suffix = col.split("_")[0]
+        if suffix not in suffixes:
+            continue
+        monitorPointName = nmi + "-" + suffix
+        unit = col.split("_")[1].lower()
+        sensorId = mappings.get(monitorPointName)
+        channels.append((monitorPointName, sensorId, unit))
+        if sensorId is not None:
+            mapped.append((col, sensorId, unit))
+    if not mapped:
+        return channels, None
+
+    if "t_start" in wideDf.columns:
+        tStart = wideDf["t_start"]
+    elif wideDf.index.name == "t_start":
+        tStart = wideDf.index.to_series()
+    else:
+        raise KeyError("t_start")
+    if tStart.dt.tz is not None:
+        # Written as local time
+        tStart = tStart.dt.tz_localize(None)
+    ts = tStart.to_numpy()
+
+    rows = len(wideDf)
+    values = [wideDf[col].to_numpy() for col, _, _ in mapped]
+    if len({v.dtype for v in values}) > 1:
+        # Keep each channel's values as they are rather than upcasting
+        values = [v.astype(object) for v in values]
+    tsAll = np.tile(ts, len(mapped))
+    df = pd.DataFrame({
+        "sensorId": np.repeat(np.array([sensorId for _, sensorId, _ in mapped], dtype=object), rows),
+        "ts": tsAll,
+        "val": np.concatenate(values),
+        "unit": np.repeat(np.array([unit for _, _, unit in mapped], dtype=object), rows),
+        "its": tsAll,
+    })
+    return channels, df
+
+
+class SpillBuffer:
+    """Byte chunks kept in a temporary file in /tmp rather than in memory.
+
+    Each chunk is appended with an item of metadata, such as its row count
+    or object key, and items() reads them back in order one chunk at a
+    time. Nothing should be appended while items() is being read.
+    """
+
+    def __init__(self):
+        self._file = None
+        self._items = []
+
+    def append(self, data: bytes, meta=None):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        self._file.write(data)
+        self._items.append((len(data), meta))
+
+    def items(self):
+        """Yield (data, meta) for each chunk in the order they were appended."""
+        if not self._items:
+            return
+        self._file.seek(0)
+        for length, meta in self._items:
+            yield self._file.read(length), meta
+
+    def clear(self):
+        """Drop every chunk, keeping the file for reuse."""
+        self._items = []
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+
+    def close(self):
+        """Drop every chunk and delete the file."""
+        self._items = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SensorDataWriter:
+    """Collect sensor data frames and upload them to hudibucketsrc as a few large CSV objects.
+
+    Frames must have the sensorId,ts,val,unit,its columns, with ts and its
+    as datetimes or already formatted. Rows added for a file are spilled to
+    /tmp until commit(), so nothing from a file that fails part way through
+    is uploaded, discard() drops them instead, and memory doesn't grow with
+    the size of the file. Committed rows are queued on the
+    uploader as an object each time they reach target_rows or target_bytes.
+    target_bytes counts the uncompressed CSV when compressed is set.
+    close() uploads the rest and waits for every object, and finish()
+    uploads the rest and returns the futures to wait on later.
+    """
+
+    def __init__(self, uploader, name: str, target_rows: int, target_bytes: int, compressed: bool = False):
+        self.uploader = uploader
+        self.name = name
+        self.target_rows = target_rows
+        self.target_bytes = target_bytes
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+        )
+        self.encoder = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS, compressed=compressed)
+        self.objects_written = 0
+        self._pending = SpillBuffer()
+        self._chunks = []
+        self._rows = 0
+        self._bytes = 0
+        self._uploads = []
+
+    def add(self, df: pd.DataFrame):
+        """Spill the rows of a frame to /tmp until commit() or discard()."""
+        self._pending.append(self.encoder.encode_rows(df), len(df))
+
+    def commit(self):
+        """Queue the rows added since the last commit, uploading an object each time a target is reached."""
+        for chunk, rows in self._pending.items():
+            self._chunks.append(chunk)
+            self._rows += rows
+            self._bytes += len(chunk)
+            if self._rows >= self.target_rows or self._bytes >= self.target_bytes:
+                self.flush()
+        self._pending.clear()
+
+    def discard(self):
+        """Drop the rows added since the last commit."""
+        self._pending.clear()
+
+    def flush(self):
+        """Upload the buffered rows as one object."""
+        if not self._chunks:
+            return
+        body = self.encoder.compress(b"".join([self.encoder.header] + self._chunks))
+        self._chunks = []
+        key = sensorDataObjectKey(self.name, self.encoder.compressed)
+        if len(body) < MULTIPART_THRESHOLD:
+            upload = self.uploader.put_object(Bucket=SENSOR_DATA_BUCKET, Key=key, Body=body)
+        else:
+            upload = self.uploader.upload_fileobj(
+                Fileobj=io.BytesIO(body), Bucket=SENSOR_DATA_BUCKET, Key=key, Config=self.transfer_config
+            )
+        self._uploads.append(upload)
+        self.objects_written += 1
+        self._rows = 0
+        self._bytes = 0
+
+    def finish(self) -> list:
+        """Upload the committed rows and return the upload futures of every object, without waiting."""
+        self.flush()
+        self._pending.close()
+        uploads, self._uploads = self._uploads, []
+        return uploads
+
+    def close(self):
+        """Upload the committed rows and wait for every object."""
+        wait_for_uploads(self.finish())
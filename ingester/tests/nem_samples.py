@@ -0,0 +1,14 @@
+"""Small NEM files for the tests."""
+
+
+def nem12_text(nmi: str = "NMI0000001", days: int = 2, interval: int = 30, suffixes=("E1", "B1")) -> str:
+    """A NEM12 file with one 200 block per suffix, of readings 0.001, 0.002, ..."""
+    per_day = 24 * 60 // interval
+    rows = ["100,NEM12,202301010000,SENDER,RECEIVER"]
+    for suffix in suffixes:
+        rows.append(f"200,{nmi},E1B1,1,{suffix},N1,METSER1,KWH,{interval},")
+        for day in range(days):
+            values = ",".join(f"{(day * per_day + i + 1) / 1000:.3f}" for i in range(per_day))
+            rows.append(f"300,202301{day + 1:02d},{values},A,,,20230110000000,")
+    rows.append("900")
+    return "\n".join(rows) + "\n"
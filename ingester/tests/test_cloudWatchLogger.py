@@ -0,0 +1,155 @@
+import logging
+from datetime import datetime, timezone
+
+import modules.common as common
+from modules.common import (
+    CloudWatchLogger,
+    LOG_BATCH_MAX_BYTES,
+    LOG_BATCH_MAX_EVENTS,
+    LOG_EVENT_MAX_BYTES,
+    LOG_EVENT_OVERHEAD_BYTES,
+    flush_all_loggers,
+)
+
+
+class StubLogsClient:
+    class exceptions:
+        class ResourceAlreadyExistsException(Exception):
+            pass
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.streams = []
+        self.batches = []
+
+    def create_log_stream(self, logGroupName, logStreamName):
+        if logStreamName in self.streams:
+            raise self.exceptions.ResourceAlreadyExistsException()
+        self.streams.append(logStreamName)
+
+    def put_log_events(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("AccessDenied")
+        self.batches.append(kwargs)
+        return {"nextSequenceToken": str(len(self.batches))}
+
+
+def stub_logger(client) -> CloudWatchLogger:
+    # Nothing is sent by the background thread while a test runs
+    return CloudWatchLogger("test-log-group", client=client, flush_interval=3600)
+
+
+def batch_sizes(client) -> list:
+    return [len(batch["logEvents"]) for batch in client.batches]
+
+
+def batch_bytes(batch) -> int:
+    return sum(len(event["message"].encode("utf-8")) + LOG_EVENT_OVERHEAD_BYTES for event in batch["logEvents"])
+
+
+def ms(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def test_batches_split_at_the_event_limit():
+    client = StubLogsClient()
+    logger = stub_logger(client)
+    for i in range(LOG_BATCH_MAX_EVENTS + 1):
+        logger.log(str(i))
+    logger.flush()
+
+    assert batch_sizes(client) == [LOG_BATCH_MAX_EVENTS, 1]
+    messages = [event["message"] for batch in client.batches for event in batch["logEvents"]]
+    assert sorted(messages, key=int) == [str(i) for i in range(LOG_BATCH_MAX_EVENTS + 1)]
+
+
+def test_batches_split_at_the_byte_limit_counting_event_overhead():
+    client = StubLogsClient()
+    logger = stub_logger(client)
+    for _ in range(1100):
+        logger.log("x" * 1000)
+    logger.flush()
+
+    # 1048 events of 1000 bytes would fit without the 26 byte overhead
+    per_batch = LOG_BATCH_MAX_BYTES // (1000 + LOG_EVENT_OVERHEAD_BYTES)
+    assert per_batch == 1022
+    assert batch_sizes(client) == [per_batch, 1100 - per_batch]
+    assert all(batch_bytes(batch) <= LOG_BATCH_MAX_BYTES for batch in client.batches)
+
+
+def test_batch_of_largest_events_exactly_fills_the_limit():
+    client = StubLogsClient()
+    logger = stub_logger(client)
+    for _ in range(5):
+        logger.log("x" * LOG_EVENT_MAX_BYTES)
+    logger.flush()
+
+    assert batch_sizes(client) == [4, 1]
+    assert batch_bytes(client.batches[0]) == LOG_BATCH_MAX_BYTES
+
+
+def test_oversized_event_is_truncated_to_whole_characters():
+    client = StubLogsClient()
+    logger = stub_logger(client)
+    message = "x" + "é" * LOG_EVENT_MAX_BYTES
+    logger.log(message)
+    logger.flush()
+
+    sent = client.batches[0]["logEvents"][0]["message"]
+    # é is two bytes, and after the x the limit falls in the middle of one
+    assert len(sent.encode("utf-8")) == LOG_EVENT_MAX_BYTES - 1
+    assert message.startswith(sent)
+
+
+def test_events_are_sent_to_the_stream_of_their_utc_day():
+    client = StubLogsClient()
+    logger = stub_logger(client)
+    logger._send_batch([
+        (ms(2024, 1, 1, 23, 59, 59), "before midnight", 15),
+        (ms(2024, 1, 2, 0, 0, 0), "midnight", 8),
+        (ms(2024, 1, 2, 12, 0, 0), "noon", 4),
+    ])
+    logger._send_batch([(ms(2024, 1, 2, 13, 0, 0), "afternoon", 9)])
+
+    assert client.streams == ["day-2024-01-01", "day-2024-01-02"]
+    assert [(batch["logStreamName"], [e["message"] for e in batch["logEvents"]]) for batch in client.batches] == [
+        ("day-2024-01-01", ["before midnight"]),
+        ("day-2024-01-02", ["midnight", "noon"]),
+        ("day-2024-01-02", ["afternoon"]),
+    ]
+    # A new stream starts without a sequence token, the same stream reuses it
+    assert "sequenceToken" not in client.batches[1]
+    assert client.batches[2]["sequenceToken"] == "2"
+
+
+def test_flush_all_loggers_sends_every_logger():
+    clients = [StubLogsClient(), StubLogsClient()]
+    loggers = [stub_logger(client) for client in clients]
+    loggers[0].log("first")
+    loggers[1].log("second")
+    loggers[1].log("third")
+
+    flush_all_loggers()
+
+    assert [batch_sizes(client) for client in clients] == [[1], [2]]
+
+
+def test_failed_batch_is_reported_through_logging(caplog):
+    logger = stub_logger(StubLogsClient(fail=True))
+    logger.log("lost")
+    with caplog.at_level(logging.WARNING, logger="modules.common"):
+        logger.flush()
+    assert "CloudWatchLogger test-log-group: dropped 1 events: AccessDenied" in caplog.text
+
+
+def test_dropped_events_are_reported_through_logging(caplog, monkeypatch):
+    monkeypatch.setattr(common, "LOG_MAX_BUFFERED_EVENTS", 3)
+    client = StubLogsClient()
+    logger = stub_logger(client)
+    for i in range(5):
+        logger.log(str(i))
+    with caplog.at_level(logging.WARNING, logger="modules.common"):
+        logger.flush()
+    assert batch_sizes(client) == [3]
+    assert "CloudWatchLogger test-log-group: buffer full, dropped 2 events" in caplog.text
+    assert logger.dropped_events == 0
@@ -0,0 +1,109 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from modules.nemreader import read_nem_file
+from modules.nemreader.columnar import ChannelBlockBuilder, block_to_readings
+from modules.nemreader.nem_objects import EventRecord, IntervalRecord, Reading
+from modules.nemreader.nem_reader import update_reading_events
+from nem_samples import nem12_text
+
+INTERVAL = 30
+NUM_INTERVALS = 48
+
+
+def interval_record(day: int) -> IntervalRecord:
+    values = np.arange(NUM_INTERVALS, dtype=float) + day
+    return IntervalRecord(
+        interval_date=datetime(2023, 1, day),
+        interval_values=values,
+        quality_method="A",
+        meter_serial_number="METSER1",
+        reason_code="",
+        reason_description="",
+        update_datetime=None,
+        msats_load_datatime=None,
+    )
+
+
+def legacy_readings(record: IntervalRecord) -> list:
+    """The Reading tuples the row-at-a-time parser built for a 300 row."""
+    block = ChannelBlockBuilder("kWh", "METSER1")
+    block.add_interval_record(record, INTERVAL)
+    return block_to_readings(block.build())
+
+
+def apply_both(events_by_day: dict):
+    builder = ChannelBlockBuilder("kWh", "METSER1")
+    expected = []
+    for day, events in events_by_day.items():
+        record = interval_record(day)
+        builder.add_interval_record(record, INTERVAL)
+        readings = legacy_readings(record)
+        for event in events:
+            builder.apply_event(event)
+            readings = update_reading_events(readings, event)
+        expected.extend(readings)
+    return block_to_readings(builder.build()), expected
+
+
+def test_overlapping_events_match_update_reading_events():
+    readings, expected = apply_both({
+        1: [
+            EventRecord(1, 10, "S14", "79", "Reset"),
+            EventRecord(5, 20, "F52", "", ""),
+            EventRecord(15, 15, "E", "1", "Free text"),
+            EventRecord(48, 48, "S", "", ""),
+        ],
+        2: [],
+        3: [
+            EventRecord(1, 48, "V", "", ""),
+            EventRecord(10, 12, "S14", "79", "Reset"),
+            # end before start covers nothing, as before
+            EventRecord(30, 29, "F", "", ""),
+        ],
+    })
+    assert readings == expected
+    assert readings[4].quality_method == "F52"
+    assert readings[14].event_code == "1"
+    assert readings[2 * NUM_INTERVALS + 10].quality_method == "S14"
+
+
+def test_later_events_win_on_overlap():
+    readings, _ = apply_both({1: [EventRecord(1, 48, "V", "", ""), EventRecord(1, 48, "A", "", "")]})
+    assert {r.quality_method for r in readings} == {"A"}
+
+
+@pytest.mark.parametrize("start, end", [(0, 5), (40, 49), (49, 60)])
+def test_out_of_range_events_are_rejected(start, end):
+    builder = ChannelBlockBuilder("kWh", "METSER1")
+    builder.add_interval_record(interval_record(1), INTERVAL)
+    with pytest.raises(ValueError, match="outside"):
+        builder.apply_event(EventRecord(start, end, "S", "", ""))
+
+
+def test_event_before_any_interval_row_is_rejected():
+    with pytest.raises(ValueError):
+        ChannelBlockBuilder("kWh", "METSER1").apply_event(EventRecord(1, 2, "S", "", ""))
+
+
+def test_events_in_file_match_tuple_output(tmp_path):
+    text = nem12_text(days=2, suffixes=("E1",))
+    lines = text.splitlines()
+    # A 400 row after each 300 row, overlapping ranges
+    lines.insert(3, "400,1,12,S14,79,Reset")
+    lines.insert(4, "400,10,20,F52,,")
+    lines.insert(6, "400,48,48,E,1,Free text")
+    path = tmp_path / "events.csv"
+    path.write_text("\n".join(lines) + "\n")
+    nem = read_nem_file(str(path))
+    readings = nem.readings["NMI0000001"]["E1_KWH"]
+    qualities = [r.quality_method for r in readings]
+    assert qualities[:9] == ["S14"] * 9
+    assert qualities[9:20] == ["F52"] * 11
+    assert qualities[20:48] == ["A"] * 28
+    assert qualities[48:95] == ["A"] * 47
+    assert (readings[95].quality_method, readings[95].event_code, readings[95].event_desc) == ("E", "1", "Free text")
+    assert all(isinstance(r, Reading) for r in readings)
+
@@ -0,0 +1,40 @@
+import csv
+
+import pytest
+
+from modules.nemreader import output_as_daily_csv
+from nem_samples import nem12_text
+
+
+def daily_totals(path):
+    with open(path, newline="") as csv_file:
+        return {(row["channel"], row["day"]): row["day_total"] for row in csv.DictReader(csv_file)}
+
+
+def test_complete_days_are_summed(tmp_path):
+    nem_file = tmp_path / "meters.csv"
+    nem_file.write_text(nem12_text())
+
+    totals = daily_totals(output_as_daily_csv(str(nem_file), output_dir=tmp_path))
+
+    # Readings 0.001 to 0.048 on the first day
+    assert float(totals[("E1_KWH", "20230101")]) == pytest.approx(sum(range(1, 49)) / 1000)
+    assert float(totals[("E1_KWH", "20230102")]) == pytest.approx(sum(range(49, 97)) / 1000)
+
+
+@pytest.mark.parametrize("missing", ["", "NaN", "x"])
+def test_day_with_missing_interval_is_blank(tmp_path, caplog, missing):
+    rows = nem12_text().splitlines()
+    # The second day of E1, first interval
+    fields = rows[3].split(",")
+    fields[2] = missing
+    rows[3] = ",".join(fields)
+    nem_file = tmp_path / "meters.csv"
+    nem_file.write_text("\n".join(rows) + "\n")
+
+    totals = daily_totals(output_as_daily_csv(str(nem_file), output_dir=tmp_path))
+
+    assert totals[("E1_KWH", "20230102")] == ""
+    assert float(totals[("E1_KWH", "20230101")]) == pytest.approx(sum(range(1, 49)) / 1000)
+    assert float(totals[("B1_KWH", "20230102")]) == pytest.approx(sum(range(49, 97)) / 1000)
+    assert "NMI0000001 E1_KWH has missing values, totals left blank for 20230102" in caplog.text
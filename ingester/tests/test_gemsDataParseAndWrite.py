@@ -0,0 +1,115 @@
+import json
+from concurrent.futures import Future
+
+import pytest
+
+import gemsDataParseAndWrite as ingester
+
+
+class StubLog:
+    def __init__(self):
+        self.messages = []
+
+    def log(self, message):
+        self.messages.append(message)
+
+
+@pytest.fixture
+def error_log(monkeypatch):
+    log = StubLog()
+    monkeypatch.setattr(ingester, "error_log", log)
+    return log
+
+
+@pytest.fixture
+def moves(monkeypatch):
+    moves = []
+    monkeypatch.setattr(ingester, "move_s3_file", lambda bucket, key, dest: moves.append((key, dest)))
+    return moves
+
+
+def finished(error=None):
+    future = Future()
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+    return future
+
+
+def stage_timings():
+    return {"parseAndUpload": 0.0, "move": 0.0}
+
+
+def test_settled_file_is_moved_once_uploaded(error_log, moves):
+    assert ingester.settleFileUploads("/tmp/x/meters.csv", [finished(), finished()], stage_timings())
+    assert moves == [("/tmp/x/meters.csv", "newP/")]
+    assert error_log.messages == []
+
+
+def test_file_with_failed_upload_is_left_to_retry(error_log, moves):
+    uploads = [finished(), finished(RuntimeError("SlowDown")), finished()]
+    assert not ingester.settleFileUploads("/tmp/x/meters.csv", uploads, stage_timings())
+    assert moves == []
+    assert error_log.messages == ["Uploading output of /tmp/x/meters.csv Failed with Error: SlowDown"]
+
+
+def sqs_record(message_id, body):
+    return {"messageId": message_id, "body": body if isinstance(body, str) else json.dumps(body)}
+
+
+def s3_notification(*keys):
+    return {"Records": [{"s3": {"bucket": {"name": "sbm-file-ingester"}, "object": {"key": key, "size": 10}}} for key in keys]}
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    parsed = []
+
+    def parseAndWriteData(tbp_files):
+        parsed.extend(tbp_files)
+        return [f for f in tbp_files if "bad" in f["file_name"]]
+
+    monkeypatch.setattr(ingester, "parseAndWriteData", parseAndWriteData)
+    return parsed
+
+
+def test_unreadable_records_are_returned_to_the_queue(error_log, parsed):
+    event = {"Records": [
+        sqs_record("good", s3_notification("newTBP/a.csv")),
+        sqs_record("not-json", "{truncated"),
+        sqs_record("no-records", {"Message": "something else"}),
+        sqs_record("no-key", {"Records": [{"s3": {"bucket": {"name": "sbm-file-ingester"}, "object": {}}}]}),
+    ]}
+
+    result = ingester.process_sqs_batch(event)
+
+    assert [f["file_name"] for f in parsed] == ["newTBP/a.csv"]
+    assert result == {"batchItemFailures": [
+        {"itemIdentifier": "not-json"},
+        {"itemIdentifier": "no-records"},
+        {"itemIdentifier": "no-key"},
+    ]}
+    assert len(error_log.messages) == 3
+
+
+def test_s3_test_event_is_consumed(error_log, parsed):
+    event = {"Records": [
+        sqs_record("test", {"Service": "Amazon S3", "Event": "s3:TestEvent", "Bucket": "sbm-file-ingester"}),
+    ]}
+
+    assert ingester.process_sqs_batch(event) == {"batchItemFailures": []}
+    assert parsed == []
+    assert error_log.messages == []
+
+
+def test_failed_files_and_unreadable_records_are_both_returned(error_log, parsed):
+    event = {"Records": [
+        sqs_record("bad-file", s3_notification("newTBP/bad.csv")),
+        sqs_record("not-json", "{truncated"),
+        sqs_record("good", s3_notification("newTBP/a.csv")),
+    ]}
+
+    result = ingester.process_sqs_batch(event)
+
+    assert result == {"batchItemFailures": [{"itemIdentifier": "not-json"}, {"itemIdentifier": "bad-file"}]}
@@ -0,0 +1,111 @@
+import gzip
+import os
+import subprocess
+import sys
+import zipfile
+
+import numpy as np
+import pytest
+
+from modules.nemreader import read_nem_file, read_nem_file_indexed
+from modules.nemreader.nem_index import INDEX_SUFFIX, index_path, load_nem_index
+from nem_samples import nem12_text
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def quoted(text: str) -> str:
+    return "".join(",".join(f'"{field}"' for field in line.split(",")) + "\n" for line in text.splitlines())
+
+
+def write_plain(path, text):
+    path.write_text(text)
+
+
+def write_quoted(path, text):
+    path.write_text(quoted(text))
+
+
+def write_gzip(path, text):
+    with gzip.open(path, "wt") as nem_file:
+        nem_file.write(text)
+
+
+def write_zip(path, text):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("meters.csv", text)
+
+
+UNINDEXABLE = [
+    ("quoted.csv", write_quoted),
+    ("meters.csv.gz", write_gzip),
+    ("meters.zip", write_zip),
+]
+
+
+def assert_same_readings(actual, expected):
+    assert list(actual.readings) == list(expected.readings)
+    for nmi in expected.readings:
+        assert list(actual.readings[nmi]) == list(expected.readings[nmi])
+        for channel, block in expected.readings[nmi].items():
+            np.testing.assert_array_equal(actual.readings[nmi][channel].t_start, block.t_start)
+            np.testing.assert_array_equal(actual.readings[nmi][channel].read_value, block.read_value)
+
+
+def run_cli(*args):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC, os.path.join(SRC, "modules")]))
+    return subprocess.run(
+        [sys.executable, "-m", "nemreader", *args], capture_output=True, text=True, env=env
+    )
+
+
+def test_plain_file_is_indexed(tmp_path):
+    path = tmp_path / "meters.csv"
+    write_plain(path, nem12_text())
+
+    m = read_nem_file_indexed(str(path), columnar=True)
+
+    assert os.path.exists(str(path) + INDEX_SUFFIX)
+    assert_same_readings(m, read_nem_file(str(path), columnar=True))
+
+
+@pytest.mark.parametrize("name, write", UNINDEXABLE)
+def test_unindexable_file_is_read_in_full(tmp_path, name, write):
+    path = tmp_path / name
+    write(path, nem12_text())
+
+    m = read_nem_file_indexed(str(path), columnar=True)
+
+    assert not os.path.exists(str(path) + INDEX_SUFFIX)
+    expected = tmp_path / "plain.csv"
+    write_plain(expected, nem12_text())
+    assert_same_readings(m, read_nem_file(str(expected), columnar=True))
+
+
+@pytest.mark.parametrize("name, write", UNINDEXABLE)
+def test_cli_index_reports_unindexable_file(tmp_path, name, write):
+    path = tmp_path / name
+    write(path, nem12_text())
+
+    result = run_cli("index", str(path))
+
+    assert result.returncode == 1
+    assert result.stderr.strip() == f"Error: {path} can't be indexed by byte offset"
+    assert "Traceback" not in result.stderr
+
+
+def test_cli_index_prints_the_blocks_it_saved(tmp_path):
+    path = tmp_path / "meters.csv"
+    write_plain(path, nem12_text())
+    cache_dir = tmp_path / "cache"
+
+    result = run_cli("index", str(path), "--cachedir", str(cache_dir))
+
+    assert result.returncode == 0, result.stderr
+    index = load_nem_index(str(path), cache_dir=str(cache_dir))
+    lines = result.stdout.splitlines()
+    assert lines[0] == f"Created {index_path(str(path), str(cache_dir), sha256=index.sha256)}"
+    assert lines[1:] == [
+        f"NMI0000001[{suffix}_KWH] 30min 2023-01-01..2023-01-02 bytes {block.location.start}-{block.location.end}"
+        for suffix, block in zip(("E1", "B1"), index.blocks)
+    ]
@@ -0,0 +1,32 @@
+import zipfile
+
+import pytest
+
+from modules.nemreader import read_nem_file
+from nem_samples import nem12_text
+
+
+def write_zip(path, members: dict):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return str(path)
+
+
+def test_non_nem_members_are_skipped(tmp_path):
+    path = write_zip(tmp_path / "meters.zip", {
+        "README.txt": "Meter data export\nversion,2\n",
+        "meters.csv": nem12_text(),
+        "logo.bin": b"\xff\xd8\xff\xe0\x00binary",
+        "folder/": "",
+    })
+    nem = read_nem_file(path)
+    assert nem.header.version_header == "NEM12"
+    assert set(nem.readings["NMI0000001"]) == {"E1_KWH", "B1_KWH"}
+    assert len(nem.readings["NMI0000001"]["E1_KWH"]) == 96
+
+
+def test_zip_without_nem_members_is_rejected(tmp_path):
+    path = write_zip(tmp_path / "readme.zip", {"README.txt": "nothing here\n"})
+    with pytest.raises(ValueError, match="no NEM files"):
+        read_nem_file(path)
@@ -0,0 +1,59 @@
+import io
+
+from botocore.exceptions import ClientError
+
+from modules.s3Uploader import S3Uploader
+
+
+def throttle_error(operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": "SlowDown", "Message": "Please reduce your request rate."}}, operation)
+
+
+class FailOnceClient:
+    """Stub S3 client that reads the whole upload, failing the first attempt after reading it."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.uploaded = {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):
+        self.attempts += 1
+        data = Fileobj.read()
+        if self.attempts == 1:
+            raise throttle_error("UploadPart")
+        self.uploaded[Key] = data
+
+    def put_object(self, Bucket, Key, Body):
+        self.attempts += 1
+        data = Body.read() if hasattr(Body, "read") else Body
+        if self.attempts == 1:
+            raise throttle_error("PutObject")
+        self.uploaded[Key] = data
+
+
+def uploader(client) -> S3Uploader:
+    return S3Uploader(client=client, base_delay=0, max_delay=0)
+
+
+def test_retried_upload_fileobj_sends_the_whole_body():
+    client = FailOnceClient()
+    body = b"sensorId,ts,val,unit,its\n" + b"x" * 100000
+    uploader(client).upload_fileobj(Fileobj=io.BytesIO(body), Bucket="b", Key="k").result()
+    assert client.attempts == 2
+    assert len(client.uploaded["k"]) == len(body)
+    assert client.uploaded["k"] == body
+
+
+def test_retry_rewinds_to_the_starting_position():
+    client = FailOnceClient()
+    fileobj = io.BytesIO(b"skipped" + b"payload")
+    fileobj.seek(len(b"skipped"))
+    uploader(client).put_object(Bucket="b", Key="k", Body=fileobj).result()
+    assert client.uploaded["k"] == b"payload"
+
+
+def test_bytes_body_is_retried_unchanged():
+    client = FailOnceClient()
+    uploader(client).put_object(Bucket="b", Key="k", Body=b"rows").result()
+    assert client.attempts == 2
+    assert client.uploaded["k"] == b"rows"
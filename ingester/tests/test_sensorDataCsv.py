@@ -0,0 +1,111 @@
+import gzip
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.sensorDataCsv import SensorDataCsvEncoder
+from modules.sensorDataWriter import SENSOR_DATA_COLUMNS
+
+
+def pandas_csv(df: pd.DataFrame) -> bytes:
+    """The serialisation the encoder replaced: strftime of ts and its, then to_csv."""
+    df = df.copy()
+    for column in ("ts", "its"):
+        if df[column].dtype.kind == "M" or isinstance(df[column].dtype, pd.DatetimeTZDtype):
+            df[column] = df[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df[SENSOR_DATA_COLUMNS].to_csv(index=False).encode("utf-8")
+
+
+def sensor_frame(rows: int, interval: str = "30min", start: str = "2024-01-01", seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(start, periods=rows, freq=interval)
+    # Meter readings, which are parsed from text with a few decimal places
+    values = (rng.random(rows) * 100).round(3)
+    values[rng.random(rows) < 0.01] = np.nan
+    return pd.DataFrame({"sensorId": "p:site:1a2b3c", "ts": ts, "val": values, "unit": "kwh", "its": ts})
+
+
+def nat_and_fractional_seconds():
+    df = sensor_frame(200)
+    df.loc[3, "ts"] = pd.NaT
+    df["its"] = df["ts"] + pd.Timedelta(milliseconds=750)
+    return df
+
+
+def extreme_floats():
+    df = sensor_frame(20)
+    df["val"] = [
+        1e-7, 1e-4, 9.99999e-5, 1e20, -0.0, 0.0, np.inf, -np.inf, np.nan, 123456789.125,
+        999999999.999999, 1e9, -1234.5, 0.1 + 0.2, 2.0 ** -30, 5e-324, 1.7976931348623157e308, 1e16, 12.0, -3e-5,
+    ]
+    return df
+
+
+def timezone_aware():
+    df = sensor_frame(48)
+    df["ts"] = df["ts"].dt.tz_localize("Australia/Sydney")
+    return df
+
+
+def object_values():
+    df = sensor_frame(6)
+    df["sensorId"] = ["a,b", 'q"uote', "é", 42, "line\nbreak", None]
+    df["val"] = np.array([1, 2.5, None, "7", np.float64(0.1), True], dtype=object)
+    df["unit"] = ["kwh", "kvarh", None, "kva", "kw", "kwh"]
+    return df
+
+
+def integer_values():
+    df = sensor_frame(10)
+    df["val"] = np.arange(-5, 5)
+    return df
+
+
+def float32_values():
+    df = sensor_frame(10)
+    df["val"] = np.array([0.1, 1.5, np.nan, -2.25, 1e-7, 3.4e38, 16777217, 0, 0.3, 100.001], dtype=np.float32)
+    return df
+
+
+def preformatted_timestamps():
+    df = sensor_frame(10)
+    df["ts"] = df["ts"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["its"] = df["ts"]
+    return df
+
+
+CASES = {
+    "empty": lambda: sensor_frame(0),
+    "5 minute": lambda: sensor_frame(5000, "5min"),
+    "daily": lambda: sensor_frame(400, "1D"),
+    "irregular seconds": lambda: sensor_frame(3000, "7s", "1999-12-31 23:00:00"),
+    "NaT and fractional seconds": nat_and_fractional_seconds,
+    "extreme floats": extreme_floats,
+    "timezone aware": timezone_aware,
+    "object columns, quoting and unicode": object_values,
+    "integer values": integer_values,
+    "float32 values": float32_values,
+    "preformatted timestamps": preformatted_timestamps,
+}
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_same_bytes_as_to_csv(case):
+    df = CASES[case]()
+    assert SensorDataCsvEncoder(SENSOR_DATA_COLUMNS).encode(df) == pandas_csv(df)
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_gzip_decompresses_to_the_same_bytes(case):
+    df = CASES[case]()
+    body = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS, compressed=True).encode(df)
+    assert gzip.decompress(body) == pandas_csv(df)
+
+
+def test_rows_without_header_and_reused_buffer():
+    encoder = SensorDataCsvEncoder(SENSOR_DATA_COLUMNS)
+    large, small = sensor_frame(1000), extreme_floats()
+    # The buffer grown for the large frame is reused for the small one
+    assert encoder.encode_rows(large) == pandas_csv(large).split(b"\n", 1)[1]
+    assert encoder.encode_rows(small) == pandas_csv(small).split(b"\n", 1)[1]
@@ -0,0 +1,63 @@
+from concurrent.futures import Future
+
+import pandas as pd
+
+from modules.sensorDataWriter import SensorDataWriter, SpillBuffer
+
+
+class StubUploader:
+    def __init__(self):
+        self.bodies = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.bodies.append(Body)
+        future = Future()
+        future.set_result(None)
+        return future
+
+
+def sensor_rows(sensor_id: str, rows: int) -> pd.DataFrame:
+    ts = pd.date_range("2023-01-01", periods=rows, freq="30min")
+    return pd.DataFrame({"sensorId": sensor_id, "ts": ts, "val": 1.5, "unit": "kwh", "its": ts})
+
+
+def test_discarded_rows_are_never_uploaded():
+    uploader = StubUploader()
+    # Small targets, so committed rows would be uploaded straight away
+    writer = SensorDataWriter(uploader, "batch", target_rows=10, target_bytes=1 << 20)
+
+    writer.add(sensor_rows("good", 20))
+    writer.commit()
+    writer.add(sensor_rows("bad", 20))
+    writer.discard()
+    writer.close()
+
+    body = b"".join(uploader.bodies).decode()
+    assert body.count("good,") == 20
+    assert "bad," not in body
+
+
+def test_nothing_is_uploaded_before_commit():
+    uploader = StubUploader()
+    writer = SensorDataWriter(uploader, "file", target_rows=10, target_bytes=1 << 20)
+    writer.add(sensor_rows("pending", 50))
+    assert uploader.bodies == []
+    writer.commit()
+    writer.close()
+    assert sum(body.decode().count("pending,") for body in uploader.bodies) == 50
+
+
+def test_spill_buffer_reads_chunks_back_in_order():
+    spill = SpillBuffer()
+    spill.append(b"first", "a")
+    spill.append(b"", "empty")
+    spill.append(b"second chunk", "b")
+    assert list(spill.items()) == [(b"first", "a"), (b"", "empty"), (b"second chunk", "b")]
+
+    spill.clear()
+    assert list(spill.items()) == []
+    spill.append(b"reused", "c")
+    assert list(spill.items()) == [(b"reused", "c")]
+    spill.close()
+    assert list(spill.items()) == []
+
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from modules.nemreader.nem_objects import Reading
+from modules.nemreader.split_days import split_days_arrays, split_multiday_reads
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def legacy_split(reads):
+    readings = [Reading(start, end, value, "kWh", "", "A", "", "", None, None) for start, end, value in reads]
+    return [(r.t_start, r.t_end, r.read_value) for r in split_multiday_reads(readings)]
+
+
+def array_split(reads):
+    t_start = np.array([start for start, _, _ in reads], dtype="datetime64[s]")
+    t_end = np.array([end for _, end, _ in reads], dtype="datetime64[s]")
+    values = np.array([value for _, _, value in reads], dtype=float)
+    starts, ends, split_values, source = split_days_arrays(t_start, t_end, values)
+    return starts.astype(datetime).tolist(), ends.astype(datetime).tolist(), split_values.tolist(), source.tolist()
+
+
+def random_reads(rng: random.Random, count: int):
+    """Reads of random length, about half of them on midnight boundaries."""
+    reads = []
+    for _ in range(count):
+        start = datetime(2023, 1, 1) + timedelta(days=rng.randrange(365))
+        if rng.random() < 0.5:
+            start += timedelta(seconds=rng.randrange(DAY_SECONDS))
+        kind = rng.random()
+        if kind < 0.3:
+            length = rng.randrange(1, DAY_SECONDS + 1)  # up to exactly one day
+        elif kind < 0.6:
+            length = DAY_SECONDS * rng.randrange(2, 120)  # whole days
+        else:
+            length = rng.randrange(DAY_SECONDS + 1, 120 * DAY_SECONDS)
+        reads.append((start, start + timedelta(seconds=length), round(rng.uniform(0, 5000), 3)))
+    return reads
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_split_multiday_reads(seed):
+    reads = random_reads(random.Random(seed), 200)
+    expected = legacy_split(reads)
+    starts, ends, values, source = array_split(reads)
+
+    assert list(zip(starts, ends)) == [(start, end) for start, end, _ in expected]
+    assert values == pytest.approx([value for _, _, value in expected], rel=1e-12)
+    # Each piece points back at the read it came from
+    assert all(reads[i][0] <= start and end <= reads[i][1] for i, start, end in zip(source, starts, ends))
+
+
+@pytest.mark.parametrize("start, end, pieces", [
+    (datetime(2023, 3, 1), datetime(2023, 3, 2), 1),
+    (datetime(2023, 3, 1), datetime(2023, 3, 4), 3),
+    (datetime(2023, 3, 1, 6), datetime(2023, 3, 4), 3),
+    (datetime(2023, 3, 1, 6), datetime(2023, 3, 4, 6), 4),
+    (datetime(2023, 12, 30, 12), datetime(2024, 1, 2, 12), 4),
+    (datetime(2024, 2, 27), datetime(2024, 3, 2), 4),
+])
+def test_midnight_boundaries(start, end, pieces):
+    reads = [(start, end, 100.0)]
+    starts, ends, values, _ = array_split(reads)
+    assert len(starts) == pieces
+    assert list(zip(starts, ends)) == [(s, e) for s, e, _ in legacy_split(reads)]
+    assert sum(values) == pytest.approx(100.0)
+    assert all(s.time() == datetime.min.time() for s in starts[1:])